@@ -0,0 +1,71 @@
+import json
+import os
+import re
+
+import AppData
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+# far past any index the token limit allows, it only keeps the budget from growing without end in a long chapter
+MAX_CHUNK_CHARS = 1000000
+
+
+class AdaptiveChunker:
+    # Character budget per index for SsmlStrings.create_ssml_strings. The first index after a restart holds only a
+    # sentence or two so audio starts quickly. Each later index grows by `growth`. The growth is fixed when a book is
+    # first split, see chunking_plan, so the same book always splits into the same indices.
+    def __init__(self, first_chunk_chars=200, growth=2.0):
+        self.first_chunk_chars = first_chunk_chars
+        self.growth = growth
+        self.restart()
+
+    @classmethod
+    def measured(cls, synthesis_stats=None, first_chunk_chars=200, growth=2.0):
+        # never grow by more than the text that can be synthesized while the previous index plays, as measured by
+        # SynthesisStats now
+        ratio = synthesis_stats.playback_to_synthesis_ratio() if synthesis_stats else None
+        if ratio is not None:
+            growth = min(growth, max(1.0, ratio))
+        return cls(first_chunk_chars, round(growth, 2))
+
+    def settings(self):
+        return {'first_chunk_chars': self.first_chunk_chars, 'growth': self.growth}
+
+    def restart(self):
+        self.budget = self.first_chunk_chars
+        self.chunk_number = 0
+
+    def next_chunk(self):
+        self.budget = min(MAX_CHUNK_CHARS, int(self.budget * self.growth))
+        self.chunk_number += 1
+
+    def fits(self, chunk_chars, text):
+        return chunk_chars + len(text) <= self.budget
+
+    def split_first(self, chunk_chars, text):
+        # only the first index is cut inside a paragraph, at sentence ends, keeping at least one sentence
+        if self.chunk_number > 0 or self.fits(chunk_chars, text):
+            return None
+        sentences = SENTENCE_END.split(text)
+        if len(sentences) < 2:
+            return None
+        head = sentences[0]
+        for i, sentence in enumerate(sentences[1:], start=1):
+            if chunk_chars + len(head) + 1 + len(sentence) > self.budget:
+                return head, ' '.join(sentences[i:])
+            head += ' ' + sentence
+        return None
+
+
+def chunking_plan(directory, file_hash, num_tokens, synthesis_stats=None):
+    # the chunker a book was first split with. The app and BatchRender split it the same way every time, so its
+    # indices keep their numbers across sessions and rendered audio is found in the synthesis cache.
+    path = os.path.join(directory, f'{file_hash}-tokens{num_tokens}.json')
+    try:
+        with open(path) as f:
+            return AdaptiveChunker(**json.load(f))
+    except (OSError, ValueError, TypeError):
+        pass
+    chunker = AdaptiveChunker.measured(synthesis_stats)
+    with AppData.atomic_write(path) as f:
+        json.dump(chunker.settings(), f)
+    return chunker
@@ -0,0 +1,26 @@
+import os
+from contextlib import contextmanager
+
+APP_DATA_DIR = os.environ.get('RAPID_READ_PRO_HOME', os.path.join(os.path.expanduser("~"), ".rapid-read-pro"))
+
+
+def app_data_dir(*parts):
+    path = os.path.join(APP_DATA_DIR, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    # write next to path and rename over it, so a reader or a crash never sees a half written file
+    part_path = f'{path}.part'
+    try:
+        with open(part_path, mode) as f:
+            yield f
+        os.replace(part_path, path)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
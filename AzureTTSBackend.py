@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+import azure.cognitiveservices.speech as speechsdk
+
+from Synthesis import compute_word_timings, TICKS_PER_MICROSECOND
+from SynthesizerPool import SynthesizerPool, OUTPUT_FORMAT, OUTPUT_BYTES_PER_MS
+from TTSBackend import TTSBackend
+
+
+def speak(synthesizer, ssml_string, stream=None, on_first_audio=None):
+    words_with_offset = []
+
+    def word_boundary(event):
+        nonlocal words_with_offset
+        words_with_offset.append((event.audio_offset, event.text,))
+        if stream:
+            stream.add_word(event.audio_offset, event.text)
+
+    def synthesizing(event):
+        nonlocal on_first_audio
+        if on_first_audio:
+            on_first_audio()
+            on_first_audio = None
+        if stream:
+            stream.add_audio(event.result.audio_data)
+
+    synthesizer.synthesis_word_boundary.connect(word_boundary)
+    if stream or on_first_audio:
+        synthesizer.synthesizing.connect(synthesizing)
+    try:
+        result = synthesizer.speak_ssml_async(ssml_string).get()
+    finally:
+        synthesizer.synthesis_word_boundary.disconnect_all()
+        synthesizer.synthesizing.disconnect_all()
+    if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+        raise RuntimeError(f"Speech synthesis failed: {result.cancellation_details.error_details}")
+    audio_duration_ticks = result.audio_duration // timedelta(microseconds=1) * TICKS_PER_MICROSECOND
+    words_with_offset.sort()
+    milliseconds_audio_duration, word_timings = compute_word_timings(words_with_offset, audio_duration_ticks)
+    if stream:
+        stream.finish(audio_duration_ticks)
+    return result.audio_data, milliseconds_audio_duration, word_timings
+
+
+class AzureTTSBackend(TTSBackend):
+    name = "azure"
+    output_format = OUTPUT_FORMAT.name
+    audio_extension = ".mp3"
+    bytes_per_ms = OUTPUT_BYTES_PER_MS
+
+    def __init__(self, speech_key, speech_region, size=2):
+        self.speech_key = speech_key
+        self.speech_region = speech_region
+        self.synthesizer_pool = SynthesizerPool(speech_key, speech_region, size=size)
+
+    def matches(self, speech_key, speech_region):
+        return self.synthesizer_pool.matches(speech_key, speech_region)
+
+    def warm_up(self):
+        self.synthesizer_pool.warm_up()
+
+    def close(self):
+        self.synthesizer_pool.close()
+
+    def list_voices(self):
+        with self.synthesizer_pool.acquire() as speech_synthesizer:
+            r = speech_synthesizer.get_voices_async().get()
+        if r.reason != speechsdk.ResultReason.VoicesListRetrieved:
+            return None
+        return [(v.short_name, v.locale, list(v.style_list)) for v in r.voices]
+
+    def synthesize(self, ssml_string, stream=None, on_first_audio=None):
+        with self.synthesizer_pool.acquire() as synthesizer:
+            return speak(synthesizer, ssml_string, stream, on_first_audio)
@@ -0,0 +1,158 @@
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import BookOpener
+import ReadingPack
+import SsmlStrings
+from AdaptiveChunker import chunking_plan
+from AppData import app_data_dir
+from Synthesis import synthesize
+from SynthesisCache import SynthesisCache
+from SynthesisStats import SynthesisStats
+from FakeTTSBackend import FakeTTSBackend
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# audio per text character at speed 1.0 before SynthesisStats has measured it, about 15 characters a second
+DEFAULT_PLAYBACK_MS_PER_CHAR = 65
+# json of the word timings per character, a word and its offset and duration for every six characters
+TIMING_BYTES_PER_CHAR = 5
+# rates vary between voices and chapters, a book is only rendered when it fits with room to spare
+ESTIMATE_MARGIN = 1.25
+
+
+def extract_ssml_strings(file, num_tokens, items=None, chunker=None):
+    # same extraction as EpubConfigurationApp, so the rendered indices hit the cache when the book is read
+    if file.endswith(".epub"):
+        ssml_strings = []
+        with BookOpener.EpubFile(file) as epub_file:
+            documents = epub_file.documents
+            for item_page in (items if items is not None else range(len(documents))):
+                contents = SsmlStrings.extract_epub_contents(documents[item_page])
+                ssml_strings.extend(SsmlStrings.create_ssml_strings(contents, num_tokens, chunker))
+        return ssml_strings
+    elif file.endswith(".pdf"):
+        num_pages = SsmlStrings.count_pdf_pages(file)
+        ssml_strings = []
+        for item_page in (items if items is not None else range(0, num_pages, num_tokens)):
+            ssml_strings.extend(SsmlStrings.create_ssml_strings_for_pdf(file, item_page, num_tokens))
+        return ssml_strings
+    raise FileNotFoundError("non supported file")
+
+
+def estimate_cache_bytes(num_chars, bytes_per_ms, speed, synthesis_stats=None):
+    playback_ms_per_char = synthesis_stats.playback_ms_per_char if synthesis_stats else None
+    if not playback_ms_per_char:
+        playback_ms_per_char = DEFAULT_PLAYBACK_MS_PER_CHAR / float(speed)
+    return int(num_chars * (playback_ms_per_char * bytes_per_ms + TIMING_BYTES_PER_CHAR) * ESTIMATE_MARGIN)
+
+
+def render(ssml_strings, tts_backend, synthesis_cache, voice, style, speed, workers, synthesis_stats=None):
+    # every index of the book is pinned for the run, the cache evicts other books rather than the one rendering
+    final_ssml_strings = SsmlStrings.create_final_ssml_strings(ssml_strings, voice, style, speed)
+    pending = []
+    for index, (final_string, total_tokens, start_token, end_token) in enumerate(final_ssml_strings):
+        cache_key = SynthesisCache.make_key(final_string, voice, style, speed, tts_backend.output_format)
+        if synthesis_cache.contains(cache_key) and synthesis_cache.get(cache_key, pin=True):
+            continue
+        num_chars = sum(len(text) for text, doc_tag, emphasis_level in ssml_strings[index][0])
+        pending.append((index, final_string, num_chars))
+    logging.info(f"{len(final_ssml_strings) - len(pending)} of {len(final_ssml_strings)} indices already rendered")
+    if not pending:
+        return
+    tmp = tempfile.mkdtemp()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+    start = time.monotonic()
+    rendered_chars = 0
+    try:
+        futures = {executor.submit(synthesize, final_string, tts_backend, synthesis_cache, tmp, voice, style,
+                                   speed, None, synthesis_stats, pin=True): (index, num_chars)
+                   for index, final_string, num_chars in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            index, num_chars = futures[future]
+            try:
+                future.result()
+            except Exception:
+                logging.exception(f"Index {index} failed, it will be retried on the next run")
+                continue
+            rendered_chars += num_chars
+            elapsed = time.monotonic() - start
+            logging.info(f"[{done}/{len(pending)}] index {index}: {rendered_chars / elapsed:.0f} chars/s, "
+                         f"{done / (elapsed / 60):.1f} indices/min")
+    except KeyboardInterrupt:
+        logging.info("Interrupted, rendered indices are kept and skipped on the next run")
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-render a whole EPUB/PDF to audio and word timings')
+    parser.add_argument('file', type=str, metavar='EPUB_OR_PDF_FILE', help='book to render')
+    parser.add_argument('--items', type=int, nargs='*', default=None,
+                        help='EPUB item pages or PDF start pages to render, default all')
+    parser.add_argument('--num-tokens', type=int, default=50,
+                        help='Number of tokens per index/number of pages per pdf item')
+    parser.add_argument('--adaptive-chunking', action='store_true',
+                        help='small first index, growing later ones, as with the checkbox in the app')
+    parser.add_argument('--voice', type=str, default="en-US-AriaNeural")
+    parser.add_argument('--style', type=str, default="narration-professional")
+    parser.add_argument('--speed', type=str, default="1.20")
+    parser.add_argument('--workers', type=int, default=4, help='concurrent synthesis requests')
+    parser.add_argument('--backend', type=str, choices=["azure", "fake"],
+                        default=os.environ.get('RAPID_READ_PRO_TTS_BACKEND', "azure"),
+                        help='speech service, fake is the local stand-in configured by RAPID_READ_PRO_FAKE_TTS')
+    parser.add_argument('--cache-mb', type=int, default=int(os.environ.get('RAPID_READ_PRO_CACHE_MB', "500")),
+                        help='disk budget of the synthesis cache')
+    args = parser.parse_args(argv)
+
+    speech_key = os.environ.get('SPEECH_KEY', "")
+    speech_region = os.environ.get('SPEECH_REGION', "")
+    if args.backend == "azure" and (not speech_key or not speech_region):
+        logging.error("SPEECH_KEY and SPEECH_REGION must be set")
+        return 1
+    synthesis_stats = SynthesisStats(os.path.join(app_data_dir(), "synthesis-stats.json"))
+    # the book's chunking plan is shared with the app, so both split it into the same indices
+    chunker = chunking_plan(app_data_dir("chunking"), ReadingPack.fingerprint_file(args.file), args.num_tokens,
+                            synthesis_stats) if args.adaptive_chunking else None
+    ssml_strings = extract_ssml_strings(args.file, args.num_tokens, args.items, chunker)
+    total_chars = sum(len(text) for ssml_string, *_ in ssml_strings for text, doc_tag, emphasis_level in ssml_string)
+    logging.info(f"{len(ssml_strings)} indices, {total_chars} characters")
+    synthesis_cache = SynthesisCache(app_data_dir("synthesis-cache"), args.cache_mb * 1024 * 1024)
+    if args.backend == "fake":
+        tts_backend = FakeTTSBackend.from_settings(os.environ.get('RAPID_READ_PRO_FAKE_TTS', ""))
+    else:
+        # the Speech SDK's native library is only loaded when the service is used, not with --backend fake
+        from AzureTTSBackend import AzureTTSBackend
+
+        tts_backend = AzureTTSBackend(speech_key, speech_region, size=args.workers)
+    needed_bytes = estimate_cache_bytes(total_chars, tts_backend.bytes_per_ms, args.speed, synthesis_stats)
+    logging.info(f"The rendered book needs about {needed_bytes // (1024 * 1024)} MB of synthesis cache")
+    if needed_bytes > synthesis_cache.max_bytes:
+        # the cache would evict the book's first indices before the last ones are rendered
+        logging.error(f"The book does not fit into --cache-mb {args.cache_mb}, raise it to at least "
+                      f"{-(-needed_bytes // (1024 * 1024))}")
+        tts_backend.close()
+        return 1
+    tts_backend.warm_up()
+    try:
+        render(ssml_strings, tts_backend, synthesis_cache, args.voice, args.style, args.speed, args.workers,
+               synthesis_stats)
+    finally:
+        tts_backend.close()
+        stats = synthesis_cache.stats()
+        logging.info(f"Synthesis cache: {stats}")
+        if stats['bytes'] > 0.9 * stats['max_bytes']:
+            logging.warning("Synthesis cache is nearly full, raise --cache-mb so rendered indices are not evicted")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import logging
+import threading
+from bisect import bisect_right
+from collections.abc import Sequence
+
+
+class BookIndex(Sequence):
+    # The indices of a book from the selected spine item to its end, numbered continuously across items. Items are
+    # parsed by a generator when an index past the parsed ones is asked for, and only the last keep_items parsed
+    # items stay in memory. An evicted item is parsed again when one of its indices is read.
+    def __init__(self, items, load, keep_items=2):
+        self.items = items
+        self.load = load
+        self.keep_items = keep_items
+        # global number of the first index of every parsed item, and how many indices it has
+        self.starts = []
+        self.counts = []
+        self.loaded = {}
+        self.complete = False
+        self.lock = threading.RLock()
+        self.parser = self.parse_items()
+        # the selected item is always needed, for the index list
+        self.has_index(0)
+
+    def parse_items(self):
+        for position, item in enumerate(self.items):
+            ssml_strings = self.load(item)
+            logging.info(f"Parsed item {item} of the book: {len(ssml_strings)} indices")
+            yield position, ssml_strings
+
+    def parse_next(self):
+        try:
+            position, ssml_strings = next(self.parser)
+        except StopIteration:
+            self.complete = True
+            return False
+        self.starts.append(self.starts[-1] + self.counts[-1] if self.starts else 0)
+        self.counts.append(len(ssml_strings))
+        self.keep(position, ssml_strings)
+        return True
+
+    def keep(self, position, ssml_strings):
+        # least recently read items go first
+        self.loaded.pop(position, None)
+        self.loaded[position] = ssml_strings
+        while self.keep_items is not None and len(self.loaded) > self.keep_items:
+            del self.loaded[next(iter(self.loaded))]
+
+    def has_index(self, index):
+        with self.lock:
+            while index >= len(self) and not self.complete:
+                self.parse_next()
+            return 0 <= index < len(self)
+
+    def may_have_index(self, index):
+        # without parsing, indices after the parsed items may still exist
+        return 0 <= index and (index < len(self) or not self.complete)
+
+    def __len__(self):
+        return self.starts[-1] + self.counts[-1] if self.starts else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not self.has_index(index):
+            raise IndexError(index)
+        with self.lock:
+            position = bisect_right(self.starts, index) - 1
+            ssml_strings = self.loaded.get(position)
+            if ssml_strings is None:
+                ssml_strings = self.load(self.items[position])
+            self.keep(position, ssml_strings)
+            return ssml_strings[index - self.starts[position]]
@@ -0,0 +1,74 @@
+import posixpath
+import threading
+import xml.etree.ElementTree as ElementTree
+import zipfile
+from urllib.parse import unquote
+
+XHTML_MEDIA_TYPE = 'application/xhtml+xml'
+OPF_MEDIA_TYPE = 'application/oebps-package+xml'
+
+
+class EpubDocument:
+    # A document of an EPUB that stays in the zip until its content is asked for. Has the parts of ebooklib's
+    # EpubHtml that extraction uses.
+    def __init__(self, epub_file, file_name, zip_name):
+        self.epub_file = epub_file
+        self.file_name = file_name
+        self.zip_name = zip_name
+
+    def get_name(self):
+        return self.file_name
+
+    def get_content(self):
+        return self.epub_file.read(self.zip_name)
+
+
+class EpubFile:
+    # Reads the container and the OPF package of an EPUB, nothing else, through random access into the zip. Images,
+    # fonts and documents that are not selected are never decompressed.
+    def __init__(self, file):
+        self.zip = zipfile.ZipFile(file)
+        self.lock = threading.Lock()
+        container = ElementTree.fromstring(self.read('META-INF/container.xml'))
+        opf_file = next(rootfile.get('full-path') for rootfile in container.findall('.//{*}rootfile')
+                        if rootfile.get('media-type') == OPF_MEDIA_TYPE)
+        opf_dir = posixpath.dirname(opf_file)
+        package = ElementTree.fromstring(self.read(opf_file))
+        self.documents = []
+        documents_by_id = {}
+        # manifest order, the same items and numbering ebooklib gives ITEM_DOCUMENTs
+        for item in package.findall('{*}manifest/{*}item'):
+            if item.get('media-type') != XHTML_MEDIA_TYPE:
+                continue
+            file_name = unquote(item.get('href'))
+            document = EpubDocument(self, file_name, posixpath.normpath(posixpath.join(opf_dir, file_name)))
+            self.documents.append(document)
+            documents_by_id[item.get('id')] = document
+        spine = package.find('{*}spine')
+        self.spine = [] if spine is None else [documents_by_id[itemref.get('idref')]
+                                               for itemref in spine.findall('{*}itemref')
+                                               if itemref.get('idref') in documents_by_id]
+
+    def read(self, name):
+        with self.lock:
+            return self.zip.read(name)
+
+    def close(self):
+        self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def count_pdf_pages(file):
+    # the page count of the page tree root, found through the trailer and xref without parsing any page
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+
+    with open(file, 'rb') as f:
+        document = PDFDocument(PDFParser(f))
+        return resolve1(resolve1(document.catalog['Pages'])['Count'])
@@ -0,0 +1,122 @@
+import tkinter as tk
+import tkinter.font as tkFont
+from array import array
+
+
+def switch(word_length):
+    return {
+        1: 0,
+        2: 1,
+        3: 1,
+        4: 1,
+        5: 1,
+        6: 2,
+        7: 2,
+        8: 2,
+        9: 2,
+        10: 3,
+        11: 3,
+        12: 3,
+        13: 3,
+        0: -1,
+    }.get(word_length, 4)
+
+
+class CenterLine(tk.Canvas):
+    # The center line on a Canvas with persistent text items: context words, the word split around its optimal
+    # recognition point, and the highlighted letter itself. The pixel layout of every word is measured once when an
+    # index is laid out, showing a word then only moves and retexts the items.
+    def __init__(self, master, font_family, context_font_size, word_font_size, color_option):
+        super().__init__(master, bg=color_option.bg, highlightthickness=0, width=1, height=1)
+        self.context_font = tkFont.Font(family=font_family, size=context_font_size)
+        self.word_font = tkFont.Font(family=font_family, size=word_font_size)
+        # text widths per font, words repeat so much that most of an index is measured by lookups
+        self.widths = {}
+        self.words = None
+        self.prefix_widths = array('l')
+        self.pivot_widths = array('l')
+        self.tail_widths = array('l')
+        self.word_descent = self.word_font.metrics('descent')
+        self.context_descent = self.context_font.metrics('descent')
+        self.word_ascent = self.word_font.metrics('ascent')
+        self.word_linespace = self.word_font.metrics('linespace')
+        self.center_x = 0
+        self.baseline_y = 0
+        self.left_item = self.create_text(0, 0, anchor=tk.SE, font=self.context_font, fill=color_option.text)
+        self.prefix_item = self.create_text(0, 0, anchor=tk.SE, font=self.word_font, fill=color_option.text)
+        self.pivot_item = self.create_text(0, 0, anchor=tk.SW, font=self.word_font, fill=color_option.highlight)
+        self.suffix_item = self.create_text(0, 0, anchor=tk.SW, font=self.word_font, fill=color_option.text)
+        self.right_item = self.create_text(0, 0, anchor=tk.SW, font=self.context_font, fill=color_option.text)
+        self.message_item = self.create_text(0, 0, anchor=tk.CENTER, justify=tk.CENTER, font=self.context_font,
+                                             fill=color_option.highlight)
+        self.shown_index = None
+        self.bind("<Configure>", self.on_configure)
+
+    def measure(self, font, text):
+        key = (font.name, text)
+        width = self.widths.get(key)
+        if width is None:
+            width = self.widths[key] = font.measure(text)
+        return width
+
+    @staticmethod
+    def split(word):
+        # the highlighted letter is the switch(len(word))-th one, the first letter of very short words. The service
+        # can report an empty word boundary, it has nothing to highlight.
+        if not word:
+            return '', '', ''
+        pivot = max(0, switch(len(word)) - 1)
+        return word[:pivot], word[pivot], word[pivot + 1:]
+
+    def layout(self, words, known_words=0):
+        # a streamed index grows, the words laid out before keep their measurements
+        del self.prefix_widths[known_words:]
+        del self.pivot_widths[known_words:]
+        del self.tail_widths[known_words:]
+        self.words = words
+        for index in range(known_words, len(words)):
+            prefix, pivot, suffix = self.split(words.word(index))
+            self.prefix_widths.append(self.measure(self.word_font, prefix))
+            self.pivot_widths.append(self.measure(self.word_font, pivot))
+            self.tail_widths.append(self.pivot_widths[-1] + self.measure(self.word_font, suffix))
+        if not known_words:
+            self.shown_index = None
+
+    def show(self, word_index, left_words, right_words):
+        prefix, pivot, suffix = self.split(self.words.word(word_index))
+        self.shown_index = word_index
+        self.itemconfigure(self.left_item, text=left_words + ' ')
+        self.itemconfigure(self.prefix_item, text=prefix)
+        self.itemconfigure(self.pivot_item, text=pivot)
+        self.itemconfigure(self.suffix_item, text=suffix)
+        self.itemconfigure(self.right_item, text=' ' + right_words)
+        self.itemconfigure(self.message_item, text='')
+        self.place_items()
+
+    def show_message(self, text):
+        # replaces the word line, e.g. with an error, until the next word is shown
+        for item in (self.left_item, self.prefix_item, self.pivot_item, self.suffix_item, self.right_item):
+            self.itemconfigure(item, text='')
+        self.itemconfigure(self.message_item, text=text)
+        self.shown_index = None
+
+    def place_items(self):
+        if self.shown_index is None:
+            return
+        index = self.shown_index
+        # south anchors sit on the descent line, so each font is moved down by its descent to share the baseline
+        word_y = self.baseline_y + self.word_descent
+        context_y = self.baseline_y + self.context_descent
+        self.coords(self.left_item, self.center_x - self.prefix_widths[index], context_y)
+        self.coords(self.prefix_item, self.center_x, word_y)
+        self.coords(self.pivot_item, self.center_x, word_y)
+        self.coords(self.suffix_item, self.center_x + self.pivot_widths[index], word_y)
+        self.coords(self.right_item, self.center_x + self.tail_widths[index], context_y)
+
+    def on_configure(self, event):
+        self.center_x = event.width // 2
+        # the word line is centered vertically, context words share its baseline
+        self.baseline_y = (event.height - self.word_linespace) // 2 + self.word_ascent
+        self.coords(self.message_item, self.center_x, event.height // 2)
+        self.itemconfigure(self.message_item, width=event.width)
+        self.place_items()
@@ -0,0 +1,94 @@
+import csv
+import json
+import logging
+import math
+import os
+import time
+
+# upper edges of the histogram buckets in milliseconds, the last bucket holds everything above
+HISTOGRAM_EDGES_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+FRAME_COLUMNS = ['frame', 'word_index', 'word_offset_ms', 'position_ms', 'scheduled_ms', 'called_ms', 'latency_ms',
+                 'drift_ms', 'action']
+
+
+def percentile(values, fraction):
+    # nearest rank of sorted values
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def histogram(values):
+    counts = [0] * (len(HISTOGRAM_EDGES_MS) + 1)
+    for value in values:
+        bucket = 0
+        while bucket < len(HISTOGRAM_EDGES_MS) and value > HISTOGRAM_EDGES_MS[bucket]:
+            bucket += 1
+        counts[bucket] += 1
+    labels = [f'<={edge}' for edge in HISTOGRAM_EDGES_MS] + [f'>{HISTOGRAM_EDGES_MS[-1]}']
+    return dict(zip(labels, counts))
+
+
+def distribution(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50': percentile(values, 0.50),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'max': values[-1] if values else None,
+        'histogram': histogram(values),
+    }
+
+
+class DisplayProfiler:
+    # Records every frame of the word display: when the scheduler wanted it, when Tk actually ran it, where the audio
+    # was and where the word starts. When an index ends the frames are written to a csv file and the latency and
+    # drift distributions are logged and appended to display-profile.jsonl, so scheduler changes can be compared.
+    def __init__(self, directory):
+        self.directory = directory
+        self.frames = []
+
+    def frame(self, scheduled_at, called_at, position_ms, word_index, word_offset_ms, action):
+        self.frames.append((scheduled_at, called_at, position_ms, word_index, word_offset_ms, action))
+
+    def finish(self, book, index):
+        frames, self.frames = self.frames, []
+        if not frames:
+            return None
+        origin = frames[0][1]
+        name = f'{os.path.splitext(book)[0]}-index{index}-{time.strftime("%Y%m%d-%H%M%S")}'
+        latencies = []
+        drifts = []
+        with open(os.path.join(self.directory, f'{name}.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(FRAME_COLUMNS)
+            for number, (scheduled_at, called_at, position_ms, word_index, word_offset_ms, action) in enumerate(frames):
+                # a skipped word shares the callback of the word shown in its place, count that callback once
+                latency_ms = round((called_at - scheduled_at) * 1000, 2) \
+                    if scheduled_at is not None and action != 'skipped' else None
+                drift_ms = position_ms - word_offset_ms if position_ms is not None and action == 'shown' else None
+                if latency_ms is not None:
+                    latencies.append(latency_ms)
+                if drift_ms is not None:
+                    drifts.append(drift_ms)
+                writer.writerow([number, word_index, word_offset_ms, position_ms,
+                                 round((scheduled_at - origin) * 1000, 2) if scheduled_at is not None else '',
+                                 round((called_at - origin) * 1000, 2), '' if latency_ms is None else latency_ms,
+                                 '' if drift_ms is None else drift_ms, action])
+        summary = {
+            'book': book,
+            'index': index,
+            'frames': len(frames),
+            'csv': f'{name}.csv',
+            'latency_ms': distribution(latencies),
+            'drift_ms': distribution(abs(drift) for drift in drifts),
+            'mean_signed_drift_ms': round(sum(drifts) / len(drifts), 2) if drifts else None,
+        }
+        with open(os.path.join(self.directory, 'display-profile.jsonl'), 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+        logging.info(f"Display profile of index {index}: latency p50/p95/p99 "
+                     f"{summary['latency_ms']['p50']}/{summary['latency_ms']['p95']}/{summary['latency_ms']['p99']} ms, "
+                     f"drift p50/p95/p99 {summary['drift_ms']['p50']}/{summary['drift_ms']['p95']}/"
+                     f"{summary['drift_ms']['p99']} ms")
+        return summary
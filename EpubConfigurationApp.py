@@ -1,151 +1,139 @@
 import tkinter as tk
 from tkinter import ttk
 
-import pdfplumber
-from ebooklib import epub
-import ebooklib
-from bs4 import BeautifulSoup
-import xml.sax.saxutils
+import BookOpener
+import PdfPages
+import ReadingPack
+import SsmlStrings
+from AdaptiveChunker import AdaptiveChunker, chunking_plan
+from BookIndex import BookIndex
+from VirtualList import VirtualList
 
 
 class EpubConfigurationApp(ttk.Frame):
     def __init__(self, master=None):
         super().__init__(master)
         self.master = master
+        self.reading_pack = None
+        self.epub_file = None
 
     def create_widgets(self):
         self.num_tokens = tk.StringVar(value=self.master.NUM_TOKENS)
         self.tokens_label = ttk.Label(self, text="Number of tokens/Number of pages for pdf")
         self.tokens_entry = ttk.Entry(self, textvariable=self.num_tokens)
-        self.listbox = tk.Listbox(self, width=50)
-        lines = self.get_contents()
-        if lines:
-            self.listbox.config(height=min(len(lines), 50))
-            for line in lines:
-                self.listbox.insert(tk.END, line)
-            self.listbox.bind("<<ListboxSelect>>", self.next_window)
+        self.adaptive_chunking = tk.BooleanVar(value=self.master.ADAPTIVE_CHUNKING)
+        self.adaptive_chunking_entry = ttk.Checkbutton(self, text="Small first index, growing later ones (EPUB)",
+                                                       variable=self.adaptive_chunking)
+        if self.get_contents(int(self.num_tokens.get())):
+            self.listbox = VirtualList(self, len(self.items), self.item_line, self.next_window)
+        else:
+            self.listbox = VirtualList(self, 1, lambda position: "Enter EPub/Pdf to continue", lambda position: None)
         self.back_button = ttk.Button(self, text="Back", command=self.back_window)
         self.tokens_label.grid(row=0, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
         self.tokens_entry.grid(row=0, column=1, sticky=(tk.N, tk.S, tk.E, tk.W))
-        self.listbox.grid(row=1, columnspan=2, sticky=(tk.N, tk.S, tk.E, tk.W))
-        self.back_button.grid(row=2, columnspan=2, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.adaptive_chunking_entry.grid(row=1, columnspan=2, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.listbox.grid(row=2, columnspan=2, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.back_button.grid(row=3, columnspan=2, sticky=(tk.N, tk.S, tk.E, tk.W))
         self.master.eval('tk::PlaceWindow . center')
 
-    def get_contents(self):
+    def get_contents(self, num_tokens, file_hash=None):
+        # opens the book without touching any widget, a resumed session opens it before any screen is shown and
+        # passes the fingerprint it already checked the session with
+        self.reading_pack = None
+        self.epub_file = None
         try:
-            if self.master.FILE.endswith(".epub"):
-                book = epub.read_epub(self.master.FILE)
-                self.items = [item for item in book.get_items() if item.get_type() == ebooklib.ITEM_DOCUMENT]
-            elif self.master.FILE.endswith(".pdf"):
-                pdf = pdfplumber.open(self.master.FILE)
-                self.items = range(len(pdf.pages))
-                pdf.close()
-            else:
+            if not self.master.FILE.endswith(".epub") and not self.master.FILE.endswith(".pdf"):
                 raise FileNotFoundError("non supported file")
-        except FileNotFoundError as e:
-            self.listbox.insert(tk.END, "Enter EPub/Pdf to continue")
-            self.listbox.config(height=1)
-            return []
-        lines = []
-        for pg_no, item in enumerate(self.items):
-            if self.master.FILE.endswith(".epub"):
-                lines.append(f"ITEM PAGE: {pg_no}, ITEM CONTENTS: {item.file_name}\n")
+            self.file_hash = file_hash or ReadingPack.fingerprint_file(self.master.FILE)
+            pack_path = ReadingPack.pack_path(self.master.reading_pack_dir, self.master.FILE, self.file_hash,
+                                              num_tokens)
+            self.reading_pack = ReadingPack.ReadingPack.open(pack_path)
+            if self.reading_pack:
+                self.items = self.reading_pack.item_names()
+            elif self.master.FILE.endswith(".epub"):
+                self.items = [item.file_name for item in self.get_epub_file().documents]
             else:
-                lines.append(f"ITEM PAGE: {pg_no},")
-        return lines
-
-    def back_window(self):
-        self.master.show_back_window()
+                self.items = range(SsmlStrings.count_pdf_pages(self.master.FILE))
+        except FileNotFoundError as e:
+            return False
+        if not self.reading_pack and self.master.FILE.endswith(".epub"):
+            # parse the whole book once in the background, the next time it opens from the pack
+            ReadingPack.compile_pack_async(pack_path, ReadingPack.compile_pack, self.master.FILE, pack_path, num_tokens)
+        elif not self.reading_pack:
+            ReadingPack.compile_pack_async(pack_path, ReadingPack.compile_pdf_pack, pack_path,
+                                           PdfPages.page_cache_dir(self.master.pdf_page_dir, self.file_hash),
+                                           len(self.items))
+        return True
 
-    def next_window(self, event):
-        selected_item = self.listbox.get(self.listbox.curselection())
-        item_page = int(selected_item[len("ITEM PAGE: ") - 1: selected_item.index(',')])
+    def item_line(self, pg_no):
         if self.master.FILE.endswith(".epub"):
-            item = self.items[item_page]
-            html = item.get_content()
-            soup = BeautifulSoup(html, 'html.parser')
-            for s in soup.find_all(['tr', 'th', 'td']):
-                s.extract()
-            cc = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'dt', 'dd', 'li'])
-            contents = []
-            for content in cc:
-                if content.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'dt', 'dd', 'li']):
-                    continue
-                contents.append(content)
-            self.master.ssml_strings = self.create_ssml_strings(contents, int(self.num_tokens.get()))
-        else:
-            self.create_ssml_strings_for_pdf(item_page)
-        self.master.show_next_window()
+            return f"ITEM PAGE: {pg_no}, ITEM CONTENTS: {self.items[pg_no]}"
+        return f"ITEM PAGE: {pg_no},"
 
-    def create_ssml_strings_for_pdf(self, item_page):
-        num_tokens = int(self.num_tokens.get())
-        pdf = pdfplumber.open(self.master.FILE)
-        self.master.ssml_strings = []
-        for page in pdf.pages[item_page:item_page+num_tokens]:
-            lines = page.extract_text_simple(x_tolerance=1, y_tolerance=3).replace('ﬁ', 'fi').split('\n')
-            start_token = 0
-            token_number = 0
-            paragraphs = []
-            current_paragraph = ""
-            for line in lines:
-                current_paragraph += xml.sax.saxutils.escape(line)
-                if len(line) < 48:
-                    # new paragraph
-                    paragraphs.append((current_paragraph, "p", "none"))
-                    current_paragraph = ""
-                    token_number += 1
-            if current_paragraph:
-                paragraphs.append((current_paragraph, "p", "none"))
-            self.master.ssml_strings.append((paragraphs, token_number, start_token, token_number))
-        pdf.close()
+    def get_epub_file(self):
+        if self.epub_file is None:
+            self.epub_file = BookOpener.EpubFile(self.master.FILE)
+        return self.epub_file
 
-    def create_ssml_strings(self, contents, num_tokens):
-        def reset_ssml_string():
-            nonlocal curr_ssml_string, current_token_number_inside_index, token_number
-            if current_token_number_inside_index < 1:
-                return
-            if curr_ssml_string is None:
-                return
-            ssml_strings.append((curr_ssml_string, current_token_number_inside_index, token_number,
-                                 token_number + current_token_number_inside_index))
-            curr_ssml_string = []
-            token_number += current_token_number_inside_index
-            current_token_number_inside_index = 0
+    def spine_items(self, item_page):
+        # the selected item and every item after it in reading order
+        epub_file = self.get_epub_file()
+        item_numbers = {id(document): number for number, document in enumerate(epub_file.documents)}
+        spine = [item_numbers[id(document)] for document in epub_file.spine]
+        return spine[spine.index(item_page):] if item_page in spine else [item_page]
 
-        token_number = 0
-        ssml_strings = []
-        current_token_number_inside_index = 0
-        curr_ssml_string = []
+    def back_window(self):
+        self.master.show_back_window()
 
-        for content in contents:
-            text = xml.sax.saxutils.escape(content.get_text())
+    def destroy(self):
+        # a pack or EPUB the indices are read from stays open with the reading screen, MainApp closes it
+        if self.reading_pack and self.reading_pack is not self.master.reading_pack:
+            self.reading_pack.close()
+        if self.epub_file and self.epub_file is not self.master.epub_file:
+            self.epub_file.close()
+        super().destroy()
+
+    def next_window(self, item_page):
+        self.master.ADAPTIVE_CHUNKING = self.adaptive_chunking.get()
+        self.master.NUM_TOKENS = self.num_tokens.get()
+        self.master.ITEM_PAGE = item_page
+        # split with the book's own chunking plan, a resumed session brings the settings it was read with
+        self.master.CHUNKING = None
+        self.load_ssml_strings(item_page)
+        self.master.show_next_window()
 
-            if content.name.startswith('h1'):
-                doc_tag = "s"
-                emphasis_level = "strong"
-                reset_ssml_string()
-            elif content.name.startswith('h2') or content.name.startswith('h3'):
-                doc_tag = "s"
-                emphasis_level = "moderate"
-                reset_ssml_string()
+    def load_ssml_strings(self, item_page):
+        self.master.close_ssml_strings()
+        self.master.file_hash = self.file_hash
+        num_tokens = int(self.master.NUM_TOKENS)
+        if self.master.ADAPTIVE_CHUNKING and self.master.CHUNKING is None:
+            self.master.CHUNKING = chunking_plan(self.master.chunking_dir, self.file_hash, num_tokens,
+                                                 self.master.synthesis_stats).settings()
+        if self.master.FILE.endswith(".epub"):
+            if self.reading_pack and self.reading_pack.num_tokens == num_tokens and not self.master.ADAPTIVE_CHUNKING:
+                load = self.reading_pack.ssml_strings
+                self.master.reading_pack = self.reading_pack
             else:
-                doc_tag = "p"
-                emphasis_level = "none"
+                epub_file = self.master.epub_file = self.get_epub_file()
 
-            if current_token_number_inside_index >= num_tokens:
-                reset_ssml_string()
-            if text == '':
-                reset_ssml_string()
-                continue
-            if len(text.split()) < 1:
-                continue
-            token_string = (text, doc_tag, emphasis_level)
-            curr_ssml_string.append(token_string)
-            current_token_number_inside_index += 1
+                def load(item):
+                    contents = SsmlStrings.extract_epub_contents(epub_file.documents[item])
+                    return self.create_ssml_strings(contents, num_tokens)
+            # reading continues through the rest of the book. An evicted item is parsed again with the same frozen
+            # chunking settings, so it splits into the same indices
+            self.master.ssml_strings = BookIndex(self.spine_items(item_page), load)
+        elif self.reading_pack:
+            self.master.ssml_strings = self.reading_pack.ssml_strings(item_page, num_tokens)
+            self.master.reading_pack = self.reading_pack
+        else:
+            self.create_ssml_strings_for_pdf(item_page)
 
-        if curr_ssml_string:
-            ssml_strings.append((curr_ssml_string, current_token_number_inside_index, token_number,
-                                 token_number + current_token_number_inside_index))
-            current_token_number_inside_index += 1
+    def create_ssml_strings_for_pdf(self, item_page):
+        num_pages = min(int(self.master.NUM_TOKENS), len(self.items) - item_page)
+        self.master.ssml_strings = PdfPages.PdfPages(
+            self.master.FILE, PdfPages.page_cache_dir(self.master.pdf_page_dir, self.file_hash), item_page,
+            num_pages, self.master.PDF_EXTRACTION_WORKERS)
 
-        return ssml_strings
\ No newline at end of file
+    def create_ssml_strings(self, contents, num_tokens):
+        chunker = AdaptiveChunker(**self.master.CHUNKING) if self.master.ADAPTIVE_CHUNKING else None
+        return SsmlStrings.create_ssml_strings(contents, num_tokens, chunker)
@@ -0,0 +1,136 @@
+import html
+import io
+import math
+import random
+import threading
+import time
+import wave
+
+from Synthesis import SSML_TAG, TICKS_PER_MS, compute_word_timings
+from TTSBackend import TTSBackend
+
+SAMPLE_RATE = 16000
+WAV_HEADER_BYTES = 44
+
+# how a synthesis latency is drawn from latency_ms and latency_jitter_ms
+LATENCY_DISTRIBUTIONS = ['uniform', 'normal', 'lognormal', 'exponential']
+
+FAKE_VOICES = [("en-US-AriaNeural", "en-US", ["narration-professional", "cheerful"]),
+               ("en-GB-RyanNeural", "en-GB", [""]),
+               ("de-DE-KatjaNeural", "de-DE", [""])]
+
+
+class FakeTTSBackend(TTSBackend):
+    # Local stand-in for the speech service. The same SSML always gives the same silent 16 kHz wav and the same
+    # word boundaries, each word lasting word_ms plus char_ms per character. Latency and failures are injected from
+    # a seeded random generator, so a load test replays identically. Latency is latency_ms plus a uniform jitter, a
+    # normal one with latency_jitter_ms as its deviation, a lognormal one around the median latency_ms, or an
+    # exponential tail whose mean is latency_jitter_ms.
+    name = "fake"
+    output_format = "fake-Riff16Khz16BitMonoPcm"
+    audio_extension = ".wav"
+    bytes_per_ms = SAMPLE_RATE * 2 // 1000
+
+    def __init__(self, speech_key="", speech_region="", word_ms=180, char_ms=25, latency_ms=0, latency_jitter_ms=0,
+                 failure_rate=0.0, chunks=8, valid=True, seed=0, latency_distribution='uniform', latency_sigma=0.5):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_distribution must be one of {LATENCY_DISTRIBUTIONS}")
+        self.speech_key = speech_key
+        self.speech_region = speech_region
+        self.word_ms = word_ms
+        self.char_ms = char_ms
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.chunks = chunks
+        self.valid = valid
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings, speech_key="", speech_region=""):
+        # settings like "latency_ms=800,latency_jitter_ms=400,failure_rate=0.05,latency_distribution=lognormal"
+        kwargs = {}
+        for setting in filter(None, settings.split(',')):
+            name, value = setting.split('=')
+            try:
+                value = float(value)
+                value = int(value) if value.is_integer() else value
+            except ValueError:
+                value = value.strip()
+            kwargs[name.strip()] = value
+        return cls(speech_key, speech_region, **kwargs)
+
+    def list_voices(self):
+        if not self.valid:
+            return None
+        return [(short_name, locale, list(style_list)) for short_name, locale, style_list in FAKE_VOICES]
+
+    def draw(self):
+        with self.lock:
+            failed = self.random.random() < self.failure_rate
+            latency_ms = self.draw_latency()
+        return failed, latency_ms
+
+    def draw_latency(self):
+        if self.latency_distribution == 'normal':
+            return max(0.0, self.random.gauss(self.latency_ms, self.latency_jitter_ms))
+        if self.latency_distribution == 'lognormal':
+            return self.latency_ms * math.exp(self.random.gauss(0, self.latency_sigma))
+        if self.latency_distribution == 'exponential':
+            tail_ms = self.random.expovariate(1 / self.latency_jitter_ms) if self.latency_jitter_ms else 0
+            return self.latency_ms + tail_ms
+        return self.latency_ms + self.random.uniform(0, self.latency_jitter_ms)
+
+    def synthesize(self, ssml_string, stream=None, on_first_audio=None):
+        failed, latency_ms = self.draw()
+        words = html.unescape(SSML_TAG.sub(' ', ssml_string)).split()
+        words_with_offset = []
+        offset_ms = 0
+        for word in words:
+            words_with_offset.append((offset_ms * TICKS_PER_MS, word,))
+            offset_ms += self.word_ms + self.char_ms * len(word)
+        audio_duration_ticks = offset_ms * TICKS_PER_MS
+        audio = io.BytesIO()
+        with wave.open(audio, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+            f.writeframes(bytes(offset_ms * self.bytes_per_ms))
+        audio_data = audio.getvalue()
+        if stream:
+            self.stream_out(stream, audio_data, words_with_offset, latency_ms, on_first_audio)
+        else:
+            # the audio is only returned at the end, its first chunk still arrives after a fifth of the latency
+            time.sleep(latency_ms * 0.2 / 1000)
+            if on_first_audio:
+                on_first_audio()
+            time.sleep(latency_ms * 0.8 / 1000)
+        if failed:
+            raise RuntimeError("Speech synthesis failed: injected failure")
+        if stream:
+            stream.finish(audio_duration_ticks)
+        milliseconds_audio_duration, word_timings = compute_word_timings(words_with_offset, audio_duration_ticks)
+        return audio_data, milliseconds_audio_duration, word_timings
+
+    def stream_out(self, stream, audio_data, words_with_offset, latency_ms, on_first_audio=None):
+        # the first chunk arrives after a fifth of the latency, the rest is spread evenly over the remainder
+        time.sleep(latency_ms * 0.2 / 1000)
+        chunk_bytes = (len(audio_data) - WAV_HEADER_BYTES) // self.chunks + 1
+        next_word = 0
+        start = 0
+        while start < len(audio_data):
+            end = min(len(audio_data), max(start, WAV_HEADER_BYTES) + chunk_bytes)
+            stream.add_audio(audio_data[start:end])
+            if on_first_audio and start == 0:
+                on_first_audio()
+            end_ticks = (end - WAV_HEADER_BYTES) // self.bytes_per_ms * TICKS_PER_MS
+            while next_word < len(words_with_offset) and words_with_offset[next_word][0] < end_ticks:
+                stream.add_word(*words_with_offset[next_word])
+                next_word += 1
+            start = end
+            time.sleep(latency_ms * 0.8 / self.chunks / 1000)
+        for word in words_with_offset[next_word:]:
+            stream.add_word(*word)
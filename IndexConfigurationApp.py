@@ -1,6 +1,12 @@
 import tkinter as tk
 from tkinter import ttk
 
+from PrefixIndex import PrefixIndex
+from SsmlStrings import is_ready
+from VirtualList import VirtualList
+
+PENDING_POLL_MS = 200
+
 
 class IndexConfigurationApp(ttk.Frame):
     def __init__(self, master=None):
@@ -8,23 +14,66 @@ class IndexConfigurationApp(ttk.Frame):
         self.master = master
 
     def create_widgets(self):
-        toc_lines = []
-        for i, (ssml_string, total_tokens, start_token, end_token) in enumerate(self.master.ssml_strings):
-            toc_lines.append(f"Index: {i}, Text Heading: {ssml_string[0][0][:40]}")
-        self.listbox = tk.Listbox(self, width=50, height=min(len(toc_lines), 50))
-        for toc_line in toc_lines:
-            self.listbox.insert(tk.END, toc_line)
-        self.listbox.bind("<<ListboxSelect>>", self.next_window)
+        self.num_indices = len(self.master.ssml_strings)
+        self.pending = [i for i in range(self.num_indices) if not is_ready(self.master.ssml_strings, i)]
+        # indices shown by the list, None while no search is typed
+        self.matches = None
+        self.prefix_index = None
+        self.search = tk.StringVar()
+        self.search_label = ttk.Label(self, text="Search headings")
+        self.search_entry = ttk.Entry(self, textvariable=self.search)
+        self.search_entry.bind("<KeyRelease>", lambda event: self.search_headings())
+        self.listbox = VirtualList(self, self.num_indices, lambda position: self.toc_line(self.index_at(position)),
+                                   lambda position: self.next_window(self.index_at(position)))
         self.back_button = ttk.Button(self, text="Back", command=self.back_window)
-        self.listbox.grid(row=0, sticky=(tk.N, tk.S, tk.E, tk.W))
-        self.back_button.grid(row=1, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.search_label.grid(row=0, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.search_entry.grid(row=0, column=1, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.listbox.grid(row=1, columnspan=2, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.back_button.grid(row=2, columnspan=2, sticky=(tk.N, tk.S, tk.E, tk.W))
         self.master.eval('tk::PlaceWindow . center')
+        if self.pending:
+            self.after(PENDING_POLL_MS, self.fill_pending)
+
+    def index_at(self, position):
+        return position if self.matches is None else self.matches[position]
+
+    def heading(self, i):
+        ssml_string, total_tokens, start_token, end_token = self.master.ssml_strings[i]
+        return ssml_string[0][0][:40]
+
+    def toc_line(self, i):
+        if not is_ready(self.master.ssml_strings, i):
+            return f"Index: {i}, Text Heading: (extracting...)"
+        return f"Index: {i}, Text Heading: {self.heading(i)}"
+
+    def search_headings(self):
+        if self.prefix_index is None:
+            # built on the first search, so the list itself shows without reading every heading
+            self.prefix_index = PrefixIndex()
+            pending = set(self.pending)
+            self.prefix_index.extend((i, self.heading(i)) for i in range(self.num_indices) if i not in pending)
+        self.matches = self.prefix_index.search(self.search.get())
+        self.listbox.set_count(self.num_indices if self.matches is None else len(self.matches))
+
+    def fill_pending(self):
+        # headings of indices that were still extracting when the list was shown
+        if not self.winfo_exists():
+            return
+        pending = []
+        for i in self.pending:
+            if is_ready(self.master.ssml_strings, i):
+                if self.prefix_index:
+                    self.prefix_index.add(i, self.heading(i))
+            else:
+                pending.append(i)
+        self.pending = pending
+        self.listbox.render()
+        if pending:
+            self.after(PENDING_POLL_MS, self.fill_pending)
 
     def back_window(self):
         self.master.show_back_window()
 
-    def next_window(self, event):
-        selected_index = self.listbox.get(self.listbox.curselection())
-        start_index = int(selected_index[len("Index: ") - 1: selected_index.index(',')])
+    def next_window(self, start_index):
         self.master.START_INDEX = start_index
-        self.master.show_next_window()
\ No newline at end of file
+        self.master.show_next_window()
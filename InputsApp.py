@@ -1,8 +1,6 @@
 import os.path
 import tkinter as tk
 from tkinter import ttk, filedialog
-import azure.cognitiveservices.speech as speechsdk
-from azure.cognitiveservices.speech import ResultReason
 
 
 class InputsApp(ttk.Frame):
@@ -41,13 +39,14 @@ class InputsApp(ttk.Frame):
         self.master.show_next_window()
 
     def check_speech_key(self):
-        speech_config = speechsdk.SpeechConfig(subscription=self.master.SPEECH_KEY, region=self.master.SPEECH_REGION)
-        speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
-        r = speech_synthesizer.get_voices_async().get()
-        if r.reason != ResultReason.VoicesListRetrieved:
-            return False
-        else:
+        voice_catalog = self.master.get_voice_catalog()
+        tts_backend = self.master.get_tts_backend()
+        if voice_catalog.validated_for(self.master.SPEECH_KEY):
+            # the key already listed voices in this region, revalidate in the background once the catalog expires
+            if voice_catalog.is_stale():
+                voice_catalog.refresh_async(tts_backend)
             return True
+        return voice_catalog.refresh(tts_backend)
 
     def open_file(self):
         file_path = filedialog.askopenfilename(title="Add Epub/PDF File",
@@ -3,13 +3,24 @@ import tempfile
 import tkinter as tk
 import os
 import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 
 import ColorOptions
+import ReadingPack
+from AppData import app_data_dir
 from EpubConfigurationApp import EpubConfigurationApp
 from IndexConfigurationApp import IndexConfigurationApp
 from InputsApp import InputsApp
+from PdfPages import PdfPages
 from RapidReadProApp import RapidReadProApp
 from ReadingConfigurationApp import ReadingConfigurationApp
+from ReadingMetrics import ReadingMetrics
+from SessionStore import SessionStore
+from SynthesisCache import SynthesisCache
+from SynthesisStats import SynthesisStats
+from FakeTTSBackend import FakeTTSBackend
+from VoiceCatalog import VoiceCatalog
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -23,7 +34,12 @@ class MainApp(tk.Tk):
         self.SPEECH_REGION = os.environ.get('SPEECH_REGION', "")
         self.FILE = ""
         self.NUM_TOKENS = "50"
+        self.ADAPTIVE_CHUNKING = False
+        # the frozen AdaptiveChunker settings of the book being read
+        self.CHUNKING = None
+        self.ITEM_PAGE = 0
         self.START_INDEX = 0
+        self.ssml_strings = []
         self.SPEED = "1.20"
         self.VOICE = "en-US-AriaNeural"
         self.STYLE = "narration-professional"
@@ -36,24 +52,175 @@ class MainApp(tk.Tk):
         self.SEPERATOR_LINE_HEIGHT = 15
         self.SEPERATOR_LINE_WIDTH = 3
         self.NUM_WORDS_IN_CENTER_TEXT = 5
+        # words kept in each context pane around the reading point, the panes never hold the whole index
+        self.CONTEXT_PANE_WORDS = 300
+        self.PREFETCH_DEPTH = 2
+        self.MAX_PREFETCH_DEPTH = 6
+        self.PREFETCH_POLL_MS = 50
+        self.STREAMING = False
+        self.STREAM_JITTER_BUFFER_MS = 500
+        self.STREAM_GUARD_MS = 300
+        self.CACHE_MAX_MB = int(os.environ.get('RAPID_READ_PRO_CACHE_MB', "500"))
+        self.VOICE_CATALOG_TTL_HOURS = 24
         self.tmp = tempfile.mkdtemp()
+        self.synthesis_cache = SynthesisCache(app_data_dir("synthesis-cache"), self.CACHE_MAX_MB * 1024 * 1024)
+        self.synthesis_stats = SynthesisStats(os.path.join(app_data_dir(), "synthesis-stats.json"))
+        # per-index metrics as json lines and a Prometheus text file
+        self.reading_metrics = ReadingMetrics(app_data_dir("metrics"))
+        # per-frame display timing of every index, written under profiles/ when RAPID_READ_PRO_PROFILE_DISPLAY=1
+        self.PROFILE_DISPLAY = os.environ.get('RAPID_READ_PRO_PROFILE_DISPLAY', "") == "1"
+        self.profile_dir = app_data_dir("profiles") if self.PROFILE_DISPLAY else None
+        self.reading_pack_dir = app_data_dir("reading-packs")
+        # the pack or EPUB the current indices are read from, open until another book is loaded
+        self.reading_pack = None
+        self.epub_file = None
+        self.chunking_dir = app_data_dir("chunking")
+        self.pdf_page_dir = app_data_dir("pdf-pages")
+        self.PDF_EXTRACTION_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+        # reopen the book read last at the word reading stopped, set RAPID_READ_PRO_RESUME=0 to start at the inputs
+        self.RESUME_SESSION = os.environ.get('RAPID_READ_PRO_RESUME', "1") != "0"
+        self.session_store = SessionStore(app_data_dir("sessions"))
+        self.file_hash = None
+        # "azure", or "fake" for the local stand-in engine configured by RAPID_READ_PRO_FAKE_TTS
+        self.TTS_BACKEND = os.environ.get('RAPID_READ_PRO_TTS_BACKEND', "azure")
+        self.tts_backend = None
+        # a backend being built on a worker thread, see warm_up_tts_backend
+        self.tts_backend_future = None
+        self.voice_catalog = None
+        if self.SPEECH_KEY and self.SPEECH_REGION:
+            # open the service connections while the user is still on the first screens
+            self.warm_up_tts_backend()
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.window_classes = [InputsApp, EpubConfigurationApp, IndexConfigurationApp, ReadingConfigurationApp,
                                RapidReadProApp]
         self.current_window = 0
+        if not self.resume_session():
+            self.create_window()
+
+    def resume_session(self):
+        # the key is not stored with the session, without one from the environment the inputs screen asks for it
+        if not self.RESUME_SESSION or not self.SPEECH_KEY or not self.SPEECH_REGION:
+            return False
+        session = self.session_store.last()
+        if not session or not os.path.exists(session.get('FILE', "")):
+            return False
+        file_hash = ReadingPack.fingerprint_file(session['FILE'])
+        if file_hash != session.get('file_hash'):
+            logging.info(f"Not resuming {session['FILE']}, the book changed")
+            return False
+        if not SessionStore.restore(self, session):
+            return False
+        loader = EpubConfigurationApp(self)
+        opened = loader.get_contents(int(self.NUM_TOKENS), file_hash)
+        if opened:
+            loader.load_ssml_strings(self.ITEM_PAGE)
+        loader.destroy()
+        if not opened:
+            return False
+        logging.info(f"Resuming {self.FILE} at index {self.START_INDEX}, word {session['word_index']}")
+        self.current_window = self.window_classes.index(RapidReadProApp)
         self.create_window()
+        self.window.start_audio_and_display(self.START_INDEX, session['word_index'])
+        return True
 
     def on_closing(self):
         if isinstance(self.window, RapidReadProApp):
+            self.window.save_session()
+            self.window.finish_metrics(completed=False)
             if self.window.playback:
                 self.window.playback.stop()
                 del self.window.playback
+            self.window.prefetch.shutdown()
+        logging.info(f"Synthesis cache: {self.synthesis_cache.stats()}")
+        self.close_ssml_strings()
+        if self.tts_backend_future:
+            self.tts_backend_future.add_done_callback(self.close_warmed_up_backend)
+            self.tts_backend_future = None
+        if self.tts_backend:
+            self.tts_backend.close()
         if os.path.exists(self.tmp):
             logging.info("Deleting tmp directory")
             shutil.rmtree(self.tmp)
         self.quit()
         self.destroy()
 
+    def close_ssml_strings(self):
+        # what the current indices are read from: pdf extraction workers, a memory-mapped reading pack or an EPUB
+        if isinstance(self.ssml_strings, PdfPages):
+            self.ssml_strings.close()
+        if self.reading_pack:
+            self.reading_pack.close()
+            self.reading_pack = None
+        if self.epub_file:
+            self.epub_file.close()
+            self.epub_file = None
+
+    def create_tts_backend(self, backend_name, speech_key, speech_region, size):
+        # touches no widget, it runs on the warm-up thread as well
+        if backend_name == "fake":
+            tts_backend = FakeTTSBackend.from_settings(os.environ.get('RAPID_READ_PRO_FAKE_TTS', ""), speech_key,
+                                                       speech_region)
+        else:
+            # the Speech SDK's native library is the slowest import, it loads with the first backend
+            from AzureTTSBackend import AzureTTSBackend
+
+            tts_backend = AzureTTSBackend(speech_key, speech_region, size=size)
+        tts_backend.warm_up()
+        return tts_backend
+
+    def warm_up_tts_backend(self):
+        # importing the Speech SDK and setting up its pool takes seconds in a frozen bundle, so the backend is built
+        # on a worker thread and handed to the Tk thread once it is ready
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-warm-up")
+        self.tts_backend_future = executor.submit(self.create_tts_backend, self.TTS_BACKEND, self.SPEECH_KEY,
+                                                  self.SPEECH_REGION, self.PREFETCH_DEPTH + 1)
+        executor.shutdown(wait=False)
+        self.after(self.PREFETCH_POLL_MS, self.poll_tts_backend)
+
+    def poll_tts_backend(self):
+        if self.tts_backend_future is None:
+            return
+        if not self.tts_backend_future.done():
+            self.after(self.PREFETCH_POLL_MS, self.poll_tts_backend)
+            return
+        self.take_warmed_up_backend()
+
+    def take_warmed_up_backend(self):
+        # waits only when a screen needs the backend before the warm-up finished
+        future, self.tts_backend_future = self.tts_backend_future, None
+        try:
+            tts_backend = future.result()
+        except Exception:
+            logging.exception("Warming up the speech backend failed")
+            return
+        if self.tts_backend is None:
+            self.tts_backend = tts_backend
+        else:
+            tts_backend.close()
+
+    @staticmethod
+    def close_warmed_up_backend(future):
+        # a warm-up still running when the app closes
+        if future.exception() is None:
+            future.result().close()
+
+    def get_tts_backend(self):
+        if self.tts_backend_future:
+            self.take_warmed_up_backend()
+        if self.tts_backend is None or not self.tts_backend.matches(self.SPEECH_KEY, self.SPEECH_REGION):
+            if self.tts_backend:
+                self.tts_backend.close()
+            self.tts_backend = self.create_tts_backend(self.TTS_BACKEND, self.SPEECH_KEY, self.SPEECH_REGION,
+                                                       self.PREFETCH_DEPTH + 1)
+        return self.tts_backend
+
+    def get_voice_catalog(self):
+        if self.voice_catalog is None or self.voice_catalog.region != self.SPEECH_REGION or \
+                self.voice_catalog.backend_name != self.TTS_BACKEND:
+            self.voice_catalog = VoiceCatalog(app_data_dir("voices"), self.TTS_BACKEND, self.SPEECH_REGION,
+                                              self.VOICE_CATALOG_TTL_HOURS * 3600)
+        return self.voice_catalog
+
     def create_window(self):
         self.window = self.window_classes[self.current_window](self)
         self.window.create_widgets()
@@ -79,5 +246,7 @@ class MainApp(tk.Tk):
 
 
 if __name__ == "__main__":
+    # pdf pages are extracted in worker processes, which frozen executables have to start through this
+    multiprocessing.freeze_support()
     app = MainApp()
     app.mainloop()
@@ -0,0 +1,109 @@
+import functools
+import json
+import logging
+import os
+import threading
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+
+import AppData
+import SsmlStrings
+
+PAGE_CACHE_VERSION = 1
+
+# pdfs opened by this worker process, so a worker parses the document structure once and not per page
+open_pdfs = {}
+
+
+def extract_page(file, page_number):
+    pdf = open_pdfs.get(file)
+    if pdf is None:
+        import pdfplumber
+
+        pdf = open_pdfs[file] = pdfplumber.open(file)
+    page = pdf.pages[page_number]
+    try:
+        return SsmlStrings.extract_pdf_page(page)
+    finally:
+        # drop the parsed layout objects, the worker would otherwise keep every page it extracted
+        page.close()
+
+
+def page_cache_dir(directory, file_hash):
+    path = os.path.join(directory, f'{file_hash}-v{PAGE_CACHE_VERSION}')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def cached_page_path(cache_dir, page_number):
+    return os.path.join(cache_dir, f'{page_number}.json')
+
+
+def read_cached_page(cache_dir, page_number):
+    try:
+        with open(cached_page_path(cache_dir, page_number)) as f:
+            paragraphs, total_tokens, start_token, end_token = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return [tuple(paragraph) for paragraph in paragraphs], total_tokens, start_token, end_token
+
+
+class PdfPages(Sequence):
+    # Pages first_page..first_page+num_pages of a PDF, in the layout create_ssml_strings_for_pdf returns. Pages
+    # found in the page cache are read from it, the others are extracted in page order on a process pool. Reading a
+    # page only waits for that page, so reading can start while later pages are still extracting.
+    def __init__(self, file, cache_dir, first_page, num_pages, workers):
+        self.file = file
+        self.cache_dir = cache_dir
+        self.first_page = first_page
+        self.num_pages = num_pages
+        self.pages = {}
+        self.futures = {}
+        self.executor = None
+        self.lock = threading.Lock()
+        for position in range(num_pages):
+            page = read_cached_page(cache_dir, first_page + position)
+            if page is not None:
+                self.pages[position] = page
+        pending = [position for position in range(num_pages) if position not in self.pages]
+        logging.info(f"{num_pages - len(pending)} of {num_pages} pdf pages cached")
+        if pending:
+            self.executor = ProcessPoolExecutor(max_workers=min(workers, len(pending)))
+            self.remaining = len(pending)
+            for position in pending:
+                future = self.executor.submit(extract_page, file, first_page + position)
+                future.add_done_callback(functools.partial(self.extracted, position))
+                self.futures[position] = future
+
+    def extracted(self, position, future):
+        if not future.cancelled() and future.exception() is None:
+            path = cached_page_path(self.cache_dir, self.first_page + position)
+            with AppData.atomic_write(path) as f:
+                json.dump(future.result(), f)
+        with self.lock:
+            self.remaining -= 1
+            if self.remaining == 0:
+                # every page is extracted, let the worker processes exit
+                self.executor.shutdown(wait=False)
+
+    def ready(self, position):
+        return position in self.pages or self.futures[position].done()
+
+    def __len__(self):
+        return self.num_pages
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        if position in self.pages:
+            return self.pages[position]
+        paragraphs, total_tokens, start_token, end_token = self.futures[position].result()
+        return [tuple(paragraph) for paragraph in paragraphs], total_tokens, start_token, end_token
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,76 @@
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PrefetchPipeline:
+    # Synthesizes upcoming indices on worker threads while the current one plays. The number of indices kept in
+    # flight follows the measured ratio of synthesis time to playback time, so the queue does not run dry.
+    # `release` is called with the result of every index the pipeline drops, once its synthesis is done.
+    def __init__(self, synthesize, may_have_index, depth=2, max_depth=6, release=None):
+        self.synthesize = synthesize
+        self.may_have_index = may_have_index
+        self.release = release
+        self.min_depth = max(1, depth)
+        self.max_depth = max(self.min_depth, max_depth)
+        self.depth = self.min_depth
+        self.futures = {}
+        self.synthesis_seconds = 0.0
+        self.audio_seconds = 0.0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_depth, thread_name_prefix="prefetch")
+
+    def _run(self, index, stream):
+        start = time.monotonic()
+        result = self.synthesize(index, stream)
+        self.record(time.monotonic() - start, result[1] / 1000)
+        return result
+
+    def record(self, synthesis_seconds, audio_seconds):
+        with self.lock:
+            self.synthesis_seconds += synthesis_seconds
+            self.audio_seconds += audio_seconds
+            if self.audio_seconds <= 0:
+                return
+            ratio = self.synthesis_seconds / self.audio_seconds
+            # one index playing needs ceil(ratio) indices synthesizing behind it, plus one spare
+            self.depth = min(self.max_depth, max(self.min_depth, math.ceil(ratio) + 1))
+        logging.info(f"Prefetch synthesis/playback ratio {ratio:.2f}, depth {self.depth}")
+
+    def request(self, index, stream=None):
+        future = self.futures.get(index)
+        if future is None or future.cancelled():
+            future = self.executor.submit(self._run, index, stream)
+            self.futures[index] = future
+        return future
+
+    def prefetch_after(self, index):
+        for next_index in range(index + 1, index + 1 + self.depth):
+            if not self.may_have_index(next_index):
+                break
+            self.request(next_index)
+        # keep the previous index around for Back Index, drop everything else outside the window
+        for stale_index in [i for i in self.futures if i < index - 1 or i > index + self.max_depth]:
+            self.drop(self.futures.pop(stale_index))
+
+    def drop(self, future):
+        # a running synthesis cannot be cancelled, its result is released when it arrives
+        if not future.cancel() and self.release:
+            future.add_done_callback(self.release_result)
+
+    def release_result(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.release(future.result())
+
+    def discard(self, index):
+        future = self.futures.pop(index, None)
+        if future:
+            self.drop(future)
+
+    def shutdown(self):
+        for future in self.futures.values():
+            self.drop(future)
+        self.futures = {}
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,38 @@
+import re
+from bisect import bisect_left, insort
+
+WORD = re.compile(r'\w+')
+
+
+class PrefixIndex:
+    # Sorted (word, position) pairs of every heading, so the headings with a word starting with a typed prefix are
+    # one bisect away. A query of several words matches headings that have all of them.
+    def __init__(self):
+        self.entries = []
+
+    def add(self, position, heading):
+        for word in set(WORD.findall(heading.lower())):
+            insort(self.entries, (word, position))
+
+    def extend(self, headings):
+        # (position, heading) pairs, sorted once instead of inserted one by one
+        self.entries.extend((word, position) for position, heading in headings
+                            for word in set(WORD.findall(heading.lower())))
+        self.entries.sort()
+
+    def search_word(self, prefix):
+        positions = set()
+        for word, position in self.entries[bisect_left(self.entries, (prefix,)):]:
+            if not word.startswith(prefix):
+                break
+            positions.add(position)
+        return positions
+
+    def search(self, query):
+        prefixes = WORD.findall(query.lower())
+        if not prefixes:
+            return None
+        positions = self.search_word(prefixes[0])
+        for prefix in prefixes[1:]:
+            positions &= self.search_word(prefix)
+        return sorted(positions)
@@ -1,86 +1,51 @@
-import random
-import string
 import tkinter as tk
 from tkinter import ttk
-import tkinter.font as tkFont
 from datetime import timedelta
-import azure.cognitiveservices.speech as speechsdk
 import logging
 import os
-
-from just_playback import Playback
-
+import time
+
+from CenterLine import CenterLine
+from DisplayProfiler import DisplayProfiler
+from PrefetchPipeline import PrefetchPipeline
+from SsmlStrings import FinalSsmlStrings
+from StreamingSynthesis import SynthesisStream, StreamingPlayback
+from Synthesis import generate_filename, synthesize
+from WordScheduler import WordScheduler
 from Words import Words
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-def generate_filename():
-    letters = string.ascii_lowercase
-    filename = ''.join(random.choice(letters) for _ in range(10))
-    return filename
-
-
-def speak(synthesizer, ssml_string):
-    words_with_offset = []
-
-    def word_boundary(event):
-        nonlocal words_with_offset
-        words_with_offset.append((event.audio_offset, event.text,))
-
-    synthesizer.synthesis_word_boundary.connect(word_boundary)
-    result = synthesizer.speak_ssml_async(ssml_string).get()
-    audio_duration = result.audio_duration
-    synthesizer.synthesis_completed.disconnect_all()
-    word_durations = []
-    words_with_offset.sort()
-    if len(words_with_offset) > 1:
-        word_durations.append(timedelta(microseconds=words_with_offset[1][0] / 10))
-    i = 1
-    while i < len(words_with_offset) - 1:
-        duration = timedelta(microseconds=words_with_offset[i + 1][0] / 10) - timedelta(
-            microseconds=words_with_offset[i][0] / 10)
-        word_durations.append(duration)
-        i += 1
-    last_duration = audio_duration - timedelta(microseconds=words_with_offset[-1][0] / 10)
-    word_durations.append(last_duration)
-    word_durations = [round(a.seconds * 1000 + a.microseconds / 1000) for a in word_durations]
-    words_offset_duration = [(word, round(offset / 10000), duration) for (offset, word), duration in
-                             zip(words_with_offset, word_durations)]
-    return sum(word_durations), words_offset_duration
-
-
-def switch(word_length):
-    return {
-        1: 0,
-        2: 1,
-        3: 1,
-        4: 1,
-        5: 1,
-        6: 2,
-        7: 2,
-        8: 2,
-        9: 2,
-        10: 3,
-        11: 3,
-        12: 3,
-        13: 3,
-        0: -1,
-    }.get(word_length, 4)
-
-
 class RapidReadProApp(ttk.Frame):
     def __init__(self, master=None):
         super().__init__(master)
         self.master = master
         self.display_queue = None
+        self.waiting_id = None
+        self.stream_poll_id = None
+        self.stream = None
+        # the synthesis feeding self.stream, read to notice it failing before the stream completes
+        self.stream_future = None
         self.curr_index = 0
-        self.first_run = True
+        # the index whose synthesis failed, reading waits on it until the user retries or moves on
+        self.failed_index = None
         self.playback = None
-        self.line1 = self.line2 = self.line3 = self.line4 = None
+        self.prefetch = None
+        # the index whose metrics are written when reading leaves it
+        self.metrics_index = None
+        self.requested_at = None
+        self.scheduler = WordScheduler(DisplayProfiler(master.profile_dir) if master.PROFILE_DISPLAY else None)
+        # word ranges currently shown in the context panes, None forces a full render
+        self.top_range = self.bottom_range = None
 
     def create_widgets(self):
         self.ssml_strings = self.create_ssml_strings()
+        self.master.reading_metrics.clear()
+        self.tts_backend = self.master.get_tts_backend()
+        self.prefetch = PrefetchPipeline(self.synthesize_index, self.ssml_strings.may_have_index,
+                                         depth=self.master.PREFETCH_DEPTH, max_depth=self.master.MAX_PREFETCH_DEPTH,
+                                         release=self.release_index)
         self.top_frame = ttk.Frame(self)
         self.top_text = tk.Text(self.top_frame, font=(self.master.FONT_OPTION, self.master.TOP_FONT_SIZE),
                                 bg=self.master.COLOR_OPTION.bg, fg=self.master.COLOR_OPTION.text, width=1, height=1,
@@ -89,11 +54,10 @@ class RapidReadProApp(ttk.Frame):
         self.top_text.pack(fill=tk.BOTH, expand=1)
 
         self.center_frame = ttk.Frame(self)
-        self.center_text = tk.Text(self.center_frame, font=(self.master.FONT_OPTION, self.master.CENTER_FONT_SIZE),
-                                   bg=self.master.COLOR_OPTION.bg,
-                                   fg=self.master.COLOR_OPTION.text, wrap="none", width=1, height=1)
+        self.center_line = CenterLine(self.center_frame, self.master.FONT_OPTION, self.master.CENTER_FONT_SIZE,
+                                      self.master.WORD_FONT_SIZE, self.master.COLOR_OPTION)
         self.center_frame.grid(row=2, sticky=(tk.N, tk.S, tk.E, tk.W))
-        self.center_text.pack(fill=tk.BOTH, expand=1)
+        self.center_line.pack(fill=tk.BOTH, expand=1)
 
         self.bottom_frame = ttk.Frame(self)
         self.bottom_text = tk.Text(self.bottom_frame, font=(self.master.FONT_OPTION, self.master.BOTTOM_FONT_SIZE),
@@ -106,6 +70,13 @@ class RapidReadProApp(ttk.Frame):
         self.top_line.grid(row=1, sticky=(tk.N, tk.S, tk.E, tk.W))
         self.bottom_line = tk.Canvas(self, height=self.master.SEPERATOR_LINE_HEIGHT, bg=self.master.COLOR_OPTION.bg)
         self.bottom_line.grid(row=3, sticky=(tk.N, tk.S, tk.E, tk.W))
+        # the separators only move when the window is resized
+        self.line1, self.line2 = (self.top_line.create_line(0, 0, 0, 0, width=self.master.SEPERATOR_LINE_WIDTH,
+                                                            fill=self.master.COLOR_OPTION.text) for _ in range(2))
+        self.line3, self.line4 = (self.bottom_line.create_line(0, 0, 0, 0, width=self.master.SEPERATOR_LINE_WIDTH,
+                                                               fill=self.master.COLOR_OPTION.text) for _ in range(2))
+        self.top_line.bind("<Configure>", self.place_separators)
+        self.bottom_line.bind("<Configure>", self.place_separators)
 
         self.button_frame = ttk.Frame(self)
         self.back_window = ttk.Button(self.button_frame, text="Back Window", command=self.back_window)
@@ -141,15 +112,38 @@ class RapidReadProApp(ttk.Frame):
 
     def back_window(self):
         logging.info("Back Window button pressed")
+        self.save_session()
+        self.finish_metrics(completed=False)
+        self.stop_current()
+        self.prefetch.shutdown()
+        self.master.show_back_window()
+
+    def cancel_waiting(self):
+        if self.waiting_id:
+            self.master.after_cancel(self.waiting_id)
+            self.waiting_id = None
+        if self.stream_poll_id:
+            self.master.after_cancel(self.stream_poll_id)
+            self.stream_poll_id = None
+
+    def stop_current(self):
+        if self.display_queue is None and self.waiting_id is None and self.failed_index is None:
+            # reading has not started yet
+            return False
+        self.cancel_waiting()
         if self.display_queue:
             display_id_under_queue, word_index = self.display_queue
+            # stop playing
+            self.playback.stop()
+            # Cancel next display
             if display_id_under_queue:
                 self.master.after_cancel(display_id_under_queue)
-        if self.playback:
-            self.playback.stop()
-        self.master.show_back_window()
+            self.scheduler.cancel()
+        return True
 
     def play_pause(self):
+        if self.display_queue is None or self.waiting_id or self.failed_index is not None:
+            return
         display_id_under_queue, word_index = self.display_queue
         if self.playback.playing:
             logging.info("Pause Button Pressed")
@@ -158,6 +152,7 @@ class RapidReadProApp(ttk.Frame):
             # Cancel next display
             if display_id_under_queue:
                 self.master.after_cancel(display_id_under_queue)
+            self.scheduler.cancel()
             self.display_queue = (None, word_index,)
         else:
             logging.info("Play Button Pressed")
@@ -167,200 +162,308 @@ class RapidReadProApp(ttk.Frame):
 
     def back(self):
         logging.info("Back Button Pressed")
-        display_id_under_queue, word_index = self.display_queue
-        # stop playing
-        self.playback.stop()
-        # Cancel next display
-        if display_id_under_queue:
-            self.master.after_cancel(display_id_under_queue)
+        if not self.stop_current():
+            return
         # start new execution
         self.start_audio_and_display(self.curr_index - 1)
 
     def restart(self):
         logging.info("Restart Button Pressed")
-        display_id_under_queue, word_index = self.display_queue
-        # stop playing
-        self.playback.stop()
-        # Cancel next display
-        if display_id_under_queue:
-            self.master.after_cancel(display_id_under_queue)
+        if not self.stop_current():
+            return
         # start new execution
         self.start_audio_and_display(self.curr_index)
 
     def skip(self):
         logging.info("Skip Button Pressed")
-        display_id_under_queue, word_index = self.display_queue
-        # stop playing
-        self.playback.stop()
-        # Cancel next display
-        if display_id_under_queue:
-            self.master.after_cancel(display_id_under_queue)
+        if not self.stop_current():
+            return
         # start new execution
         self.start_audio_and_display(self.curr_index + 1)
 
+    def save_session(self, word_index=None):
+        if self.display_queue is None or self.master.file_hash is None:
+            # reading has not started, keep the position of the last session
+            return
+        if self.waiting_id:
+            # the display queue still belongs to the index read before, the current one has not started
+            word_index = 0
+        elif word_index is None:
+            # the queued word is the one after the word on screen
+            word_index = max(0, self.display_queue[1] - 1)
+        self.master.session_store.save(self.master, self.master.file_hash, self.curr_index, word_index)
+
     def create_ssml_strings(self):
-        ssml_strings = []
-        for ssml_string, total_tokens, start_token, end_token in self.master.ssml_strings:
-            header = f"""<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xmlns:mstts="https://www.w3.org/2001/mstts" xml:lang="en-US"><voice name="{self.master.VOICE}">"""
-            footer = """</voice></speak>"""
-            final_string = header
-            for text, doc_tag, emphasis_level in ssml_string:
-                text = text.replace('\n', ' ')
-                if self.master.STYLE != 'default':
-                    final_string += f"""<{doc_tag}><mstts:express-as style="{self.master.STYLE}"><prosody rate="{self.master.SPEED}"><emphasis level="{emphasis_level}">{text}</emphasis></prosody></mstts:express-as></{doc_tag}>"""
-                else:
-                    final_string += f"""<{doc_tag}><prosody rate="{self.master.SPEED}"><emphasis level="{emphasis_level}">{text}</emphasis></prosody></{doc_tag}>"""
-            final_string += footer
-            ssml_strings.append((final_string, total_tokens, start_token, end_token,))
-        return ssml_strings
-
-    def get_data_from_azure(self, ssml_string):
-        self.file_path = os.path.join(self.master.tmp, f'{generate_filename()}.mp3')
-        logging.info(self.file_path)
-        speech_config = speechsdk.SpeechConfig(subscription=self.master.SPEECH_KEY,
-                                               region=self.master.SPEECH_REGION)
-        speech_config.set_speech_synthesis_output_format(
-            speechsdk.SpeechSynthesisOutputFormat.Audio16Khz128KBitRateMonoMp3)
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=self.file_path)
-        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
-        self.milliseconds_audio_duration, self.words_offset_duration = speak(synthesizer, ssml_string)
+        # built per index when it is synthesized, later pages of a PDF may still be extracting
+        return FinalSsmlStrings(self.master.ssml_strings, self.master.VOICE, self.master.STYLE, self.master.SPEED)
+
+    def get_data_from_azure(self, ssml_string, stream=None, timings=None):
+        return synthesize(ssml_string, self.tts_backend, self.master.synthesis_cache, self.master.tmp,
+                          self.master.VOICE, self.master.STYLE, self.master.SPEED, stream, self.master.synthesis_stats,
+                          timings, pin=True)
+
+    def synthesize_index(self, index, stream=None):
+        # runs on a prefetch worker thread, so it must not touch any Tk widget. Finding out whether a book index has
+        # the index may parse the rest of its item, so that happens here and not on the Tk thread
+        if not self.ssml_strings.has_index(index):
+            raise IndexError(index)
+        indexed, extraction_ms, ssml_build_ms = self.ssml_strings.timed(index)
+        ssml_string, total_tokens, start_token, end_token = indexed
+        logging.info(f"Index {index} reads from start_token: {start_token}, end_token {end_token}")
+        timings = {}
+        result = self.get_data_from_azure(ssml_string, stream, timings)
+        self.master.reading_metrics.record(index, extraction_ms=extraction_ms, ssml_build_ms=ssml_build_ms,
+                                           ssml_bytes=len(ssml_string.encode('utf-8')), ssml_chars=len(ssml_string),
+                                           **timings)
+        return result
+
+    def release_index(self, result):
+        # the pipeline no longer holds the index, its audio may be evicted from the cache again
+        file_path, milliseconds_audio_duration, word_timings = result
+        self.master.synthesis_cache.release(file_path)
+
+    def finish_metrics(self, completed):
+        if self.metrics_index is None:
+            return
+        stats = self.scheduler.stats()
+        audio_ms = self.words.offsets[-1] + self.words.times[-1] if len(self.words) else 0
+        metrics = self.master.reading_metrics.finish(
+            os.path.basename(self.master.FILE), self.metrics_index, completed=completed, streamed=self.streamed,
+            wait_ms=self.wait_ms, audio_ms=audio_ms, words=len(self.words), frames=stats['frames'],
+            frames_dropped=stats['skipped'])
+        logging.info(f"Index metrics: {metrics}")
+        if self.scheduler.profiler:
+            self.scheduler.profiler.finish(os.path.basename(self.master.FILE), self.metrics_index)
+        self.metrics_index = None
+
+    def started_index(self, index, streamed):
+        self.metrics_index = index
+        self.streamed = streamed
+        self.wait_ms = round((time.monotonic() - self.requested_at) * 1000, 1)
 
     def generate_words(self):
-        words = Words()
-        for word_index in range(len(self.words_offset_duration)):
-            if word_index - self.master.NUM_WORDS_IN_CENTER_TEXT >= 0:
-                left_words = [wd[0] for wd in
-                              self.words_offset_duration[word_index - self.master.NUM_WORDS_IN_CENTER_TEXT:word_index]]
-                left_words = ' '.join(left_words)
-                previous_words = [wd[0] for wd in
-                                  self.words_offset_duration[:word_index - self.master.NUM_WORDS_IN_CENTER_TEXT]]
-                previous_words = ' '.join(previous_words)
-            else:
-                left_words = [wd[0] for wd in self.words_offset_duration[0:word_index]]
-                left_words = ' '.join(left_words)
-                previous_words = None
-            if word_index + self.master.NUM_WORDS_IN_CENTER_TEXT < len(self.words_offset_duration):
-                right_words = [wd[0] for wd in
-                               self.words_offset_duration[
-                               word_index + 1:word_index + self.master.NUM_WORDS_IN_CENTER_TEXT]]
-                right_words = ' '.join(right_words)
-                forward_words = [wd[0] for wd in
-                                 self.words_offset_duration[word_index + self.master.NUM_WORDS_IN_CENTER_TEXT:]]
-                forward_words = ' '.join(forward_words)
-            else:
-                right_words = [wd[0] for wd in
-                               self.words_offset_duration[word_index + 1:len(self.words_offset_duration)]]
-                right_words = ' '.join(right_words)
-                forward_words = None
-            word = self.words_offset_duration[word_index][0]
-            word_offset = self.words_offset_duration[word_index][1]
-            word_time = self.words_offset_duration[word_index][2]
-            words.append(word, word_offset, word_time, left_words, right_words, previous_words, forward_words)
-        return words
+        return Words(self.word_timings, self.master.NUM_WORDS_IN_CENTER_TEXT)
 
     def play_with_playback(self):
+        # the audio library is loaded with the reading screen, not at startup
+        from just_playback import Playback
+
         playback = Playback()
         playback.load_file(self.file_path)
         return playback
 
     def display_word(self, word_index):
+        if self.stream:
+            if self.stream_failed():
+                return
+            if word_index + self.master.NUM_WORDS_IN_CENTER_TEXT >= len(self.words):
+                self.refresh_stream_words()
+            if self.stream and word_index >= len(self.words):
+                # the service has not sent this word yet, hold the display until it arrives
+                self.scheduler.cancel()
+                next_display_id = self.master.after(self.master.PREFETCH_POLL_MS, self.display_word, word_index)
+                self.display_queue = (next_display_id, word_index,)
+                return
         if word_index == len(self.words):
             if self.playback.playing:
                 self.playback.stop()
+            logging.info(f"Display drift of index {self.curr_index}: {self.scheduler.stats()}")
+            self.finish_metrics(completed=True)
             self.start_audio_and_display(self.curr_index + 1)
             return
-        word, word_offset, word_time, left_words, right_words, previous_words, forward_words = self.words[
-            word_index]
-        self.center_text.config(state=tk.NORMAL)
-        self.center_text.delete("1.0", tk.END)
-        if self.first_run:
-            center_font = tkFont.Font(family=self.master.FONT_OPTION, size=self.master.CENTER_FONT_SIZE)
-            center_font_height = center_font.metrics('linespace')
-            total_height = self.center_frame.winfo_height()
-            left_over_space = total_height - center_font_height
-            spacing1 = 0
-            if left_over_space > 0:
-                spacing1 = left_over_space // 2
-            self.center_text.config(spacing1=spacing1)
-            self.first_run = False
-        highlight_index_word = switch(len(word))
-        left_words += ' '
-        right_words = ' ' + right_words
-        self.center_text.tag_add("left_words", "1.0", f"1.{len(left_words) - 1}")
-        self.center_text.tag_config("left_words")
-        self.center_text.insert(tk.END, left_words, "left_words")
-        self.center_text.tag_add("center_word", f"1.{len(left_words)}", f"1.{len(left_words) + len(word) - 1}")
-        self.center_text.tag_config("center_word", font=(self.master.FONT_OPTION, self.master.WORD_FONT_SIZE))
-        self.center_text.insert(tk.END, word, "center_word")
-        self.center_text.tag_add("right_words", f"1.{len(left_words) + len(word)}",
-                                 f"1.{len(left_words + word + right_words)}")
-        self.center_text.tag_config("right_words")
-        self.center_text.insert(tk.END, right_words, "right_words")
-        center_width = self.center_frame.winfo_width() // 2
-        if self.center_text.bbox(f'1.{len(left_words) + highlight_index_word - 1}'):
-            x_pos = self.center_text.bbox(f'1.{len(left_words) + highlight_index_word - 1}')[0]
-        else:
-            x_pos = 0
-        self.center_text.tag_add('lmargin1', "1.0", "1.end")
-        self.center_text.tag_config('lmargin1', lmargin1=center_width - x_pos)
-        self.center_text.tag_add("highlight", f"1.{len(left_words) + highlight_index_word - 1}")
-        self.center_text.tag_config("highlight", foreground=self.master.COLOR_OPTION.highlight)
-        self.center_text.config(state=tk.DISABLED)
-        self.top_text.delete("1.0", tk.END)
-        if previous_words:
-            self.top_text.insert(f"end", previous_words)
-        self.bottom_text.delete("1.0", tk.END)
-        if forward_words:
-            self.bottom_text.insert("end", forward_words)
-        if self.line1:
-            self.top_line.delete(self.line1)
-        if self.line2:
-            self.top_line.delete(self.line2)
-        if self.line3:
-            self.bottom_line.delete(self.line3)
-        if self.line4:
-            self.bottom_line.delete(self.line4)
-        self.line1 = self.top_line.create_line(0, self.top_line.winfo_height() // 2, self.top_line.winfo_width(),
-                                  self.top_line.winfo_height() // 2, width=self.master.SEPERATOR_LINE_WIDTH,
-                                  fill=self.master.COLOR_OPTION.text)
-        self.line2 = self.top_line.create_line(self.center_frame.winfo_width() // 2, self.top_line.winfo_height() // 2,
-                                  self.center_frame.winfo_width() // 2, self.top_line.winfo_height(),
-                                  width=self.master.SEPERATOR_LINE_WIDTH, fill=self.master.COLOR_OPTION.text)
-        self.line3 = self.bottom_line.create_line(0, self.bottom_line.winfo_height() // 2,
-                                     self.bottom_line.winfo_width(), self.bottom_line.winfo_height() // 2,
-                                     width=self.master.SEPERATOR_LINE_WIDTH,
-                                     fill=self.master.COLOR_OPTION.text)
-        self.line4 = self.bottom_line.create_line(self.center_frame.winfo_width() // 2, self.bottom_line.winfo_height() // 2,
-                                     self.center_frame.winfo_width() // 2, 0,
-                                     width=self.master.SEPERATOR_LINE_WIDTH,
-                                     fill=self.master.COLOR_OPTION.text)
-        if round(self.playback.curr_pos * 1000) - (word_offset + word_time) > 100 and word_time > 100:
-            # reduce word time of next occurrence
-            logging.info("Reducing word time of this occurrence")
-            next_display_id = self.master.after(word_time - 100, self.display_word, word_index + 1)
-            self.display_queue = (next_display_id, word_index + 1,)
-        else:
-            next_display_id = self.master.after(word_time, self.display_word, word_index + 1)
-            self.display_queue = (next_display_id, word_index + 1,)
-
-    def start_audio_and_display(self, index):
-        if index >= (len(self.ssml_strings)):
+        # once the audio has ended its position no longer tells which word is due
+        position_ms = round(self.playback.curr_pos * 1000) if self.playback.playing else None
+        located_index = self.scheduler.locate(self.words, word_index, position_ms)
+        if located_index is None:
+            # the frame fired before the audio reached the word
+            next_display_id = self.master.after(self.scheduler.schedule(self.words, word_index, position_ms),
+                                                self.display_word, word_index)
+            self.display_queue = (next_display_id, word_index,)
+            return
+        word_index = located_index
+        word, word_offset, word_time, left_words, right_words = self.words.center(word_index)
+        self.center_line.show(word_index, left_words, right_words)
+        self.update_context_panes(word_index)
+        next_display_id = self.master.after(self.scheduler.schedule(self.words, word_index + 1, position_ms),
+                                            self.display_word, word_index + 1)
+        self.display_queue = (next_display_id, word_index + 1,)
+
+    def place_separators(self, event=None):
+        width = self.top_line.winfo_width()
+        height = self.top_line.winfo_height()
+        self.top_line.coords(self.line1, 0, height // 2, width, height // 2)
+        self.top_line.coords(self.line2, width // 2, height // 2, width // 2, height)
+        width = self.bottom_line.winfo_width()
+        height = self.bottom_line.winfo_height()
+        self.bottom_line.coords(self.line3, 0, height // 2, width, height // 2)
+        self.bottom_line.coords(self.line4, width // 2, height // 2, width // 2, 0)
+
+    def update_context_panes(self, word_index):
+        n = self.master.NUM_WORDS_IN_CENTER_TEXT
+        pane_words = self.master.CONTEXT_PANE_WORDS
+        previous_end = max(0, word_index - n)
+        forward_start = min(len(self.words), word_index + n)
+        self.top_range = self.update_pane(self.top_text, self.top_range,
+                                          (max(0, previous_end - pane_words), previous_end))
+        # the previous words end at the reading point, keep the bottom of the pane in view
+        self.top_text.see(tk.END)
+        self.bottom_range = self.update_pane(self.bottom_text, self.bottom_range,
+                                             (forward_start, min(len(self.words), forward_start + pane_words)))
+
+    def update_pane(self, pane, shown, wanted):
+        # moving forward only drops words from the front and appends words at the back, anything else is a jump
+        start, end = wanted
+        if shown is None or not shown[0] <= start <= shown[1] <= end:
+            pane.delete("1.0", tk.END)
+            pane.insert(tk.END, self.words.join(start, end))
+            return wanted
+        shown_start, shown_end = shown
+        if end > shown_end:
+            separator = ' ' if shown_end > shown_start else ''
+            pane.insert("end-1c", separator + self.words.join(shown_end, end))
+        if start == end:
+            pane.delete("1.0", tk.END)
+        elif start > shown_start:
+            # the dropped words and the space after them
+            pane.delete("1.0", f"1.0 + {self.words.starts[start] - self.words.starts[shown_start]} chars")
+        return wanted
+
+    def start_audio_and_display(self, index, word_index=0):
+        # the prefetch worker finds out whether an index past the parsed ones exists, see end_of_book
+        if not self.ssml_strings.may_have_index(index):
             return
         if index == self.master.START_INDEX:
             self.start_button.destroy()
-        ssml_string, total_tokens, start_token, end_token = self.ssml_strings[index]
         logging.info(f"Current Index: {index}")
-        logging.info(f"Reading from start_token: {start_token}, end_token {end_token}")
-        self.get_data_from_azure(ssml_string)
+        self.failed_index = None
+        self.finish_metrics(completed=False)
+        self.requested_at = time.monotonic()
+        self.cancel_waiting()
+        self.scheduler.cancel()
+        self.scheduler.reset()
         self.curr_index = index
+        self.stream = None
+        self.stream_future = None
+        stream = None
+        # a resumed index seeks into its audio, which needs the complete file
+        if self.master.STREAMING and index not in self.prefetch.futures and not word_index:
+            stream = SynthesisStream(os.path.join(self.master.tmp,
+                                                  f'{generate_filename()}{self.tts_backend.audio_extension}'))
+        future = self.prefetch.request(index, stream)
+        self.prefetch.prefetch_after(index)
+        self.wait_for_index(index, future, stream, word_index)
+
+    def wait_for_index(self, index, future, stream=None, word_index=0):
+        # poll instead of blocking on the future so the Tk main loop keeps running while the index synthesizes
+        if not future.done():
+            if stream and stream.buffered_bytes >= self.master.STREAM_JITTER_BUFFER_MS * self.tts_backend.bytes_per_ms and \
+                    stream.word_timings()[0]:
+                self.waiting_id = None
+                self.start_streaming(index, stream, future)
+                return
+            self.waiting_id = self.master.after(self.master.PREFETCH_POLL_MS, self.wait_for_index, index, future,
+                                                stream, word_index)
+            return
+        self.waiting_id = None
+        try:
+            self.file_path, self.milliseconds_audio_duration, self.word_timings = future.result()
+        except IndexError:
+            self.prefetch.discard(index)
+            self.end_of_book(index)
+            return
+        except Exception as error:
+            logging.exception(f"Synthesis of index {index} failed")
+            self.prefetch.discard(index)
+            self.show_failure(index, error)
+            return
         logging.info(
-            f"Audio Duration {timedelta(microseconds=self.milliseconds_audio_duration * 1000)}, words {len(self.words_offset_duration)}")
+            f"Audio Duration {timedelta(microseconds=self.milliseconds_audio_duration * 1000)}, words {len(self.word_timings[0])}")
         logging.info(
-            f"WPM: {len(self.words_offset_duration) / (timedelta(microseconds=self.milliseconds_audio_duration * 1000).seconds / 60)}")
+            f"WPM: {len(self.word_timings[0]) / (timedelta(microseconds=self.milliseconds_audio_duration * 1000).seconds / 60)}")
         self.words = self.generate_words()
+        self.center_line.layout(self.words)
+        self.top_range = self.bottom_range = None
         self.playback = self.play_with_playback()
         self.playback.play()
-        word_index = 0
+        self.started_index(index, streamed=False)
+        word_index = min(word_index, len(self.words) - 1) if self.words.offsets else 0
+        if word_index:
+            self.playback.seek(self.words.offsets[word_index] / 1000)
         self.display_word(word_index)
         self.display_queue = (None, word_index)
+        self.save_session(word_index)
         logging.info(f'Index {index} completed')
+
+    def end_of_book(self, index):
+        # reading stays on the last index of the book, where Back Index and Restart Index work as before
+        logging.info(f"Index {index} is past the end of the book")
+        self.curr_index = index - 1
+        self.display_queue = (None, len(self.words)) if self.playback else None
+        self.center_line.show_message("End of the book")
+
+    def show_failure(self, index, error):
+        # the buttons stay usable: Restart Index retries the index, Back Index and Skip Index move on from it
+        self.failed_index = index
+        self.display_queue = None
+        self.center_line.show_message(f"Index {index} could not be synthesized: {error}\n"
+                                      f"Press Restart Index to try again")
+
+    def start_streaming(self, index, stream, future):
+        logging.info(f"Streaming index {index} after {stream.buffered_bytes} bytes")
+        self.stream = stream
+        self.stream_future = future
+        self.word_timings = ((), (), ())
+        self.top_range = self.bottom_range = None
+        self.refresh_stream_words()
+        self.playback = StreamingPlayback(stream, self.tts_backend.bytes_per_ms, self.master.STREAM_GUARD_MS / 1000)
+        self.playback.play()
+        self.started_index(index, streamed=True)
+        self.poll_stream()
+        if self.stream_future is None:
+            # the synthesis failed while the first prefix loaded
+            return
+        word_index = 0
+        self.display_word(word_index)
+        self.display_queue = (None, word_index)
+
+    def poll_stream(self):
+        # keep loading longer prefixes until the playback holds the complete audio of the index
+        if self.stream and self.stream_failed():
+            return
+        self.playback.advance()
+        if self.playback.loaded_complete:
+            self.stream_poll_id = None
+            return
+        self.stream_poll_id = self.master.after(self.master.PREFETCH_POLL_MS, self.poll_stream)
+
+    def stream_failed(self):
+        # a synthesis that fails after streaming started never completes its stream, stop reading the index instead
+        # of holding the display and polling for audio that will not come
+        future = self.stream_future
+        if not future.done() or future.cancelled() or future.exception() is None:
+            return False
+        error = future.exception()
+        logging.error(f"Streaming synthesis of index {self.curr_index} failed", exc_info=error)
+        self.cancel_waiting()
+        if self.display_queue and self.display_queue[0]:
+            self.master.after_cancel(self.display_queue[0])
+        self.scheduler.cancel()
+        self.playback.stop()
+        self.stream = None
+        self.stream_future = None
+        self.prefetch.discard(self.curr_index)
+        self.finish_metrics(completed=False)
+        self.show_failure(self.curr_index, error)
+        return True
+
+    def refresh_stream_words(self):
+        completed = self.stream.completed
+        word_timings = self.stream.word_timings()
+        if len(word_timings[0]) > len(self.word_timings[0]) or completed:
+            known_words = len(self.word_timings[0])
+            self.word_timings = word_timings
+            self.words = self.generate_words()
+            self.center_line.layout(self.words, known_words)
+        if completed:
+            # every word and duration is final now
+            self.stream = None
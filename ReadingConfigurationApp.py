@@ -1,7 +1,8 @@
 import tkinter as tk
 from tkinter import ttk
 import tkinter.font as tkFont
-import azure.cognitiveservices.speech as speechsdk
+import logging
+
 import ColorOptions
 
 
@@ -50,6 +51,12 @@ class ReadingConfigurationApp(ttk.Frame):
         self.num_words_in_center_text = tk.StringVar(value=self.master.NUM_WORDS_IN_CENTER_TEXT)
         self.num_words_in_center_text_label = ttk.Label(self, text="Num words in center text")
         self.num_words_in_center_text_entry = ttk.Entry(self, textvariable=self.num_words_in_center_text)
+        self.prefetch_depth = tk.StringVar(value=self.master.PREFETCH_DEPTH)
+        self.prefetch_depth_label = ttk.Label(self, text="Prefetch Depth (indices)")
+        self.prefetch_depth_entry = ttk.Entry(self, textvariable=self.prefetch_depth)
+        self.streaming = tk.BooleanVar(value=self.master.STREAMING)
+        self.streaming_label = ttk.Label(self, text="Start playback while synthesizing")
+        self.streaming_entry = ttk.Checkbutton(self, variable=self.streaming)
         self.next_button = ttk.Button(self, command=self.next_window, text='Next')
         self.back_button = ttk.Button(self, text="Back", command=self.back_window)
 
@@ -77,8 +84,12 @@ class ReadingConfigurationApp(ttk.Frame):
         self.seperator_line_width_entry.grid(row=10, column=1, sticky=(tk.N, tk.S, tk.E, tk.W))
         self.num_words_in_center_text_label.grid(row=11, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
         self.num_words_in_center_text_entry.grid(row=11, column=1, sticky=(tk.N, tk.S, tk.E, tk.W))
-        self.back_button.grid(row=12, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
-        self.next_button.grid(row=12, column=1, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.prefetch_depth_label.grid(row=12, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.prefetch_depth_entry.grid(row=12, column=1, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.streaming_label.grid(row=13, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.streaming_entry.grid(row=13, column=1, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.back_button.grid(row=14, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.next_button.grid(row=14, column=1, sticky=(tk.N, tk.S, tk.E, tk.W))
         self.master.eval('tk::PlaceWindow . center')
 
     def next_window(self):
@@ -98,20 +109,44 @@ class ReadingConfigurationApp(ttk.Frame):
         self.master.SEPERATOR_LINE_HEIGHT = int(self.seperator_line_height.get())
         self.master.SEPERATOR_LINE_WIDTH = int(self.seperator_line_width.get())
         self.master.NUM_WORDS_IN_CENTER_TEXT = int(self.num_words_in_center_text.get())
+        self.master.PREFETCH_DEPTH = int(self.prefetch_depth.get())
+        self.master.STREAMING = self.streaming.get()
         self.master.show_next_window()
 
     def back_window(self):
         self.master.show_back_window()
 
     def get_list_of_available_voices_with_styles(self):
-        speech_config = speechsdk.SpeechConfig(subscription=self.master.SPEECH_KEY, region=self.master.SPEECH_REGION)
-        speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
-        r = speech_synthesizer.get_voices_async().get()
-        en_voices = [v for v in r.voices if v._locale.startswith("en")]
-        voices_with_styles = [(v._short_name, v._style_list if v._style_list[0] != '' else ['default']) for v in
-                              en_voices]
+        voice_catalog = self.master.get_voice_catalog()
+        if voice_catalog.is_stale():
+            refreshing = voice_catalog.refresh_async(self.master.get_tts_backend())
+            self.master.after(self.VOICE_POLL_MS, self.wait_for_voices, refreshing)
+        en_voices = [(short_name, style_list) for short_name, locale, style_list in voice_catalog.get_voices() if
+                     locale.startswith("en")]
+        if not en_voices:
+            # nothing cached yet, offer the current choice until the refresh completes
+            return [(self.master.VOICE, [self.master.STYLE])]
+        voices_with_styles = [(short_name, style_list if style_list and style_list[0] != '' else ['default']) for
+                              short_name, style_list in en_voices]
         return voices_with_styles
 
+    def wait_for_voices(self, refreshing):
+        if not self.winfo_exists():
+            return
+        if not refreshing.done():
+            self.master.after(self.VOICE_POLL_MS, self.wait_for_voices, refreshing)
+            return
+        try:
+            if not refreshing.result():
+                return
+        except Exception:
+            logging.exception("Voice catalog refresh failed")
+            return
+        self.voices_with_styles = self.get_list_of_available_voices_with_styles()
+        self.voice_entry['menu'].delete(0, 'end')
+        for voice, _ in self.voices_with_styles:
+            self.voice_entry['menu'].add_command(label=voice, command=tk._setit(self.voice, voice))
+
     def get_styles_of_voice(self):
         for v, s in self.voices_with_styles:
             if v == self.voice.get():
@@ -124,6 +159,8 @@ class ReadingConfigurationApp(ttk.Frame):
         for style in styles:
             self.style_entry['menu'].add_command(label=style, command=tk._setit(self.style, style))
 
+    VOICE_POLL_MS = 100
+
     SUPPORTED_FONTS = ['Verdana',
                        'Arial',
                        'Times New Roman',
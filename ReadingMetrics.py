@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+import time
+
+import AppData
+
+# per-index values summed into the Prometheus file: json key, metric name, help
+STAGES = [
+    ('extraction_ms', 'extraction_milliseconds', "Time to get the text of an index from the book"),
+    ('ssml_build_ms', 'ssml_build_milliseconds', "Time to build the SSML of an index"),
+    ('ssml_bytes', 'ssml_bytes', "UTF-8 size of the SSML of an index"),
+    ('ssml_chars', 'ssml_characters', "Characters in the SSML of an index"),
+    ('synthesis_ms', 'synthesis_milliseconds', "Time to synthesize an index or read it from the cache"),
+    ('first_byte_ms', 'first_byte_milliseconds', "Time until the service sent the first audio of an index"),
+    ('wait_ms', 'wait_milliseconds', "Time reading waited for an index after asking for it"),
+    ('audio_ms', 'audio_milliseconds', "Audio duration of an index"),
+    ('words', 'words', "Words in an index"),
+    ('frames', 'frames', "Words displayed in time with the audio"),
+    ('frames_dropped', 'frames_dropped', "Words skipped because the display fell behind the audio"),
+]
+METRIC_PREFIX = 'rapid_read_pro_index_'
+
+
+def label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class ReadingMetrics:
+    # Metrics of every index read, collected from the prefetch workers and the Tk thread while the index is prepared
+    # and played. When reading leaves an index its metrics are appended to a json lines file, and the totals per
+    # book are rewritten as a Prometheus text file for the node exporter's textfile collector.
+    def __init__(self, directory):
+        self.jsonl_path = os.path.join(directory, 'index-metrics.jsonl')
+        self.prometheus_path = os.path.join(directory, 'reading-metrics.prom')
+        self.lock = threading.Lock()
+        self.indices = {}
+        # (book, json key) -> [sum, count], and (book, hit or miss) -> count
+        self.totals = {}
+        self.cache_results = {}
+
+    def clear(self):
+        # indices are numbered per reading screen, drop what an earlier one prefetched
+        with self.lock:
+            self.indices = {}
+
+    def record(self, index, **values):
+        with self.lock:
+            self.indices.setdefault(index, {}).update(values)
+
+    def finish(self, book, index, **values):
+        with self.lock:
+            metrics = self.indices.pop(index, {})
+            metrics.update(values)
+            metrics.update(book=book, index=index, time=round(time.time(), 3))
+            for key, name, help_text in STAGES:
+                if metrics.get(key) is not None:
+                    total = self.totals.setdefault((book, key), [0, 0])
+                    total[0] += metrics[key]
+                    total[1] += 1
+            if 'cache_hit' in metrics:
+                result = 'hit' if metrics['cache_hit'] else 'miss'
+                self.cache_results[(book, result)] = self.cache_results.get((book, result), 0) + 1
+            with open(self.jsonl_path, 'a') as f:
+                f.write(json.dumps(metrics) + '\n')
+            self.write_prometheus()
+        return metrics
+
+    def write_prometheus(self):
+        lines = []
+        for key, name, help_text in STAGES:
+            metric = METRIC_PREFIX + name
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} summary')
+            for (book, total_key), (total, count) in sorted(self.totals.items()):
+                if total_key == key:
+                    lines.append(f'{metric}_sum{{book="{label_value(book)}"}} {round(total, 3)}')
+                    lines.append(f'{metric}_count{{book="{label_value(book)}"}} {count}')
+        metric = METRIC_PREFIX + 'synthesis_cache_total'
+        lines.append(f'# HELP {metric} Indices whose audio came from the synthesis cache or from the service')
+        lines.append(f'# TYPE {metric} counter')
+        for (book, result), count in sorted(self.cache_results.items()):
+            lines.append(f'{metric}{{book="{label_value(book)}",result="{result}"}} {count}')
+        with AppData.atomic_write(self.prometheus_path) as f:
+            f.write('\n'.join(lines) + '\n')
@@ -0,0 +1,208 @@
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections.abc import Sequence
+
+import AppData
+import BookOpener
+import PdfPages
+import SsmlStrings
+
+PACK_MAGIC = b'RRPK'
+PACK_VERSION = 1
+# magic, version, kind, num_tokens, items, paragraphs, indices, then the offsets of the four sections
+HEADER = struct.Struct('<4sHHIIII4Q')
+# name offset, name length, first index, index count
+ITEM = struct.Struct('<QIII')
+# text offset, text length, doc tag, emphasis level
+PARAGRAPH = struct.Struct('<QIBB2x')
+# first paragraph, paragraph count, total tokens, start token, end token
+INDEX = struct.Struct('<IIIII')
+KINDS = ['epub', 'pdf']
+DOC_TAGS = ['p', 's']
+EMPHASIS_LEVELS = ['none', 'moderate', 'strong']
+
+compiling = set()
+compiling_lock = threading.Lock()
+
+
+def fingerprint_file(file):
+    # the path, size and modification time identify a book without reading it, a changed or moved book gets a new key
+    stat = os.stat(file)
+    key_source = f'{os.path.abspath(file)}\0{stat.st_size}\0{stat.st_mtime_ns}'
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+
+def pack_path(directory, file, file_hash, num_tokens):
+    # an EPUB's indices depend on the number of tokens, a PDF's pages do not
+    settings = f'v{PACK_VERSION}-tokens{num_tokens}' if file.endswith(".epub") else f'v{PACK_VERSION}'
+    return os.path.join(directory, f'{file_hash}-{settings}.pack')
+
+
+def write_pack(path, kind, num_tokens, items):
+    # items are (name, ssml_strings) with ssml_strings as create_ssml_strings returns them
+    item_table = bytearray()
+    paragraph_table = bytearray()
+    index_table = bytearray()
+    strings = bytearray()
+    num_paragraphs = num_indices = 0
+    for name, ssml_strings in items:
+        encoded = name.encode('utf-8')
+        item_table += ITEM.pack(len(strings), len(encoded), num_indices, len(ssml_strings))
+        strings += encoded
+        for ssml_string, total_tokens, start_token, end_token in ssml_strings:
+            index_table += INDEX.pack(num_paragraphs, len(ssml_string), total_tokens, start_token, end_token)
+            num_indices += 1
+            for text, doc_tag, emphasis_level in ssml_string:
+                encoded = text.encode('utf-8')
+                paragraph_table += PARAGRAPH.pack(len(strings), len(encoded), DOC_TAGS.index(doc_tag),
+                                                  EMPHASIS_LEVELS.index(emphasis_level))
+                strings += encoded
+                num_paragraphs += 1
+    items_offset = HEADER.size
+    paragraphs_offset = items_offset + len(item_table)
+    indices_offset = paragraphs_offset + len(paragraph_table)
+    strings_offset = indices_offset + len(index_table)
+    with AppData.atomic_write(path, 'wb') as f:
+        f.write(HEADER.pack(PACK_MAGIC, PACK_VERSION, KINDS.index(kind), num_tokens, len(items), num_paragraphs,
+                            num_indices, items_offset, paragraphs_offset, indices_offset, strings_offset))
+        f.write(item_table)
+        f.write(paragraph_table)
+        f.write(index_table)
+        f.write(strings)
+
+
+def compile_pack(file, path, num_tokens):
+    items = []
+    with BookOpener.EpubFile(file) as epub_file:
+        for document in epub_file.documents:
+            contents = SsmlStrings.extract_epub_contents(document)
+            items.append((document.file_name, SsmlStrings.create_ssml_strings(contents, num_tokens)))
+    write_pack(path, 'epub', num_tokens, items)
+    logging.info(f"Compiled reading pack {path}")
+
+
+def compile_pdf_pack(path, page_cache_dir, num_pages):
+    # pdf pages are only ever extracted by PdfPages, the pack is written from its page cache once every page is there
+    items = []
+    for page_number in range(num_pages):
+        page = PdfPages.read_cached_page(page_cache_dir, page_number)
+        if page is None:
+            logging.info(f"Not compiling reading pack {path} yet, page {page_number} is not extracted")
+            return
+        items.append((str(page_number), [page]))
+    write_pack(path, 'pdf', 0, items)
+    logging.info(f"Compiled reading pack {path}")
+
+
+def compile_pack_async(path, compile, *args):
+    def run():
+        try:
+            compile(*args)
+        except Exception:
+            logging.exception(f"Could not compile the reading pack {path}")
+        finally:
+            with compiling_lock:
+                compiling.discard(path)
+
+    with compiling_lock:
+        if path in compiling:
+            return
+        compiling.add(path)
+    threading.Thread(target=run, name="reading-pack", daemon=True).start()
+
+
+class ReadingPack:
+    # A parsed book memory-mapped from disk. Only the header is read when it is opened, the tables and texts are
+    # unpacked from the mapping on access, so an open touches just the pages of what is displayed.
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, kind, self.num_tokens, self.num_items, self.num_paragraphs, self.num_indices,
+         self.items_offset, self.paragraphs_offset, self.indices_offset,
+         self.strings_offset) = HEADER.unpack_from(self.mapping)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            self.mapping.close()
+            raise ValueError(f"{path} is not a reading pack of version {PACK_VERSION}")
+        self.kind = KINDS[kind]
+
+    @classmethod
+    def open(cls, path):
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def string(self, offset, length):
+        start = self.strings_offset + offset
+        return self.mapping[start:start + length].decode('utf-8')
+
+    def item(self, item):
+        return ITEM.unpack_from(self.mapping, self.items_offset + item * ITEM.size)
+
+    def item_names(self):
+        return [self.string(*self.item(item)[:2]) for item in range(self.num_items)]
+
+    def index(self, index):
+        return INDEX.unpack_from(self.mapping, self.indices_offset + index * INDEX.size)
+
+    def paragraph(self, paragraph):
+        text_offset, text_length, doc_tag, emphasis_level = PARAGRAPH.unpack_from(
+            self.mapping, self.paragraphs_offset + paragraph * PARAGRAPH.size)
+        return self.string(text_offset, text_length), DOC_TAGS[doc_tag], EMPHASIS_LEVELS[emphasis_level]
+
+    def ssml_strings(self, first_item, num_items=1):
+        # indices of consecutive items, in the layout create_ssml_strings returns
+        last_item = min(first_item + num_items, self.num_items) - 1
+        if last_item < first_item:
+            return PackIndices(self, 0, 0)
+        first_index = self.item(first_item)[2]
+        name_offset, name_length, last_first_index, last_index_count = self.item(last_item)
+        return PackIndices(self, first_index, last_first_index + last_index_count)
+
+    def close(self):
+        self.mapping.close()
+
+
+class PackIndices(Sequence):
+    # indices start..end of a pack, unpacked when they are read
+    def __init__(self, pack, start, end):
+        self.pack = pack
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        first_paragraph, num_paragraphs, total_tokens, start_token, end_token = self.pack.index(self.start + position)
+        return PackParagraphs(self.pack, first_paragraph, num_paragraphs), total_tokens, start_token, end_token
+
+
+class PackParagraphs(Sequence):
+    # the (text, doc tag, emphasis level) tokens of one index
+    def __init__(self, pack, start, length):
+        self.pack = pack
+        self.start = start
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return self.pack.paragraph(self.start + position)
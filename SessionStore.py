@@ -0,0 +1,60 @@
+import json
+import logging
+import os
+import time
+
+import AppData
+import ColorOptions
+
+# MainApp settings a session restores, everything that decides the indices, their audio and the reading screen
+SESSION_SETTINGS = ['FILE', 'NUM_TOKENS', 'ADAPTIVE_CHUNKING', 'CHUNKING', 'ITEM_PAGE', 'SPEED', 'VOICE', 'STYLE',
+                    'FONT_OPTION', 'TOP_FONT_SIZE', 'BOTTOM_FONT_SIZE', 'CENTER_FONT_SIZE', 'WORD_FONT_SIZE',
+                    'SEPERATOR_LINE_HEIGHT', 'SEPERATOR_LINE_WIDTH', 'NUM_WORDS_IN_CENTER_TEXT', 'PREFETCH_DEPTH',
+                    'STREAMING']
+
+
+class SessionStore:
+    # One json file per book, named by the book's file hash, holding the settings it was read with and the index and
+    # word reading stopped at. The synthesized audio stays in the synthesis cache, so a resumed index is a cache hit.
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, file_hash):
+        return os.path.join(self.directory, f'{file_hash}.json')
+
+    def save(self, app, file_hash, index, word_index):
+        session = {name: getattr(app, name) for name in SESSION_SETTINGS}
+        session['COLOR_OPTION'] = app.COLOR_OPTION._name_
+        session.update({'file_hash': file_hash, 'index': index, 'word_index': word_index, 'saved_at': time.time()})
+        path = self.path(file_hash)
+        with AppData.atomic_write(path) as f:
+            json.dump(session, f)
+
+    def load(self, file_hash):
+        try:
+            with open(self.path(file_hash)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def last(self):
+        # the session of the book read most recently
+        sessions = [session for session in (self.load(name[:-len('.json')]) for name in os.listdir(self.directory)
+                                            if name.endswith('.json')) if session]
+        return max(sessions, key=lambda session: session.get('saved_at', 0), default=None)
+
+    @staticmethod
+    def restore(app, session):
+        missing = [name for name in SESSION_SETTINGS + ['index', 'word_index'] if name not in session]
+        if missing:
+            logging.warning(f"Session of {session.get('FILE')} misses {missing}, not resuming it")
+            return False
+        for name in SESSION_SETTINGS:
+            setattr(app, name, session[name])
+        app.START_INDEX = session['index']
+        app.COLOR_OPTION = ColorOptions.COLOR_OPTIONS.personal_favourite
+        for c in ColorOptions.COLOR_OPTIONS:
+            if c._name_ == session.get('COLOR_OPTION'):
+                app.COLOR_OPTION = c
+        return True
@@ -0,0 +1,307 @@
+import logging
+import time
+import html
+from collections.abc import Sequence
+from html.parser import HTMLParser
+
+import BookOpener
+
+BLOCK_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'dt', 'dd', 'li']
+TABLE_TAGS = ['tr', 'th', 'td']
+# elements whose text BeautifulSoup's get_text leaves out
+HIDDEN_TAGS = ['script', 'style', 'template', 'rt', 'rp']
+# elements BeautifulSoup closes as soon as they open, their own end tags are ignored
+VOID_TAGS = ['area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image', 'img',
+             'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track',
+             'wbr']
+
+
+def count_pdf_pages(file):
+    # the PDF stack is imported when a PDF is opened, never at startup, and pdfplumber only when the page tree root
+    # has no usable page count
+    from pdfminer.psparser import PSException
+
+    try:
+        return BookOpener.count_pdf_pages(file)
+    except (KeyError, TypeError, PSException):
+        # no usable page count in the page tree root, count the pages themselves
+        logging.info(f"Counting the pages of {file}")
+    import pdfplumber
+
+    pdf = pdfplumber.open(file)
+    num_pages = len(pdf.pages)
+    pdf.close()
+    return num_pages
+
+
+class BlockExtractor(HTMLParser):
+    # One pass over the document that keeps every open element on a stack, as BeautifulSoup builds its tree. A block
+    # is a leaf when no other block starts inside it, leaves are emitted as (tag, text) when they close. An end tag
+    # closes everything opened after its element, so a block left open by malformed markup ends with its container.
+    # Table rows and cells are skipped with everything inside them, script, style and ruby annotation text is not read.
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        # [tag, text parts or None when it is not a block, is leaf]
+        self.open_elements = []
+        self.open_blocks = []
+        self.table_depth = 0
+        self.hidden_depth = 0
+        # void elements closed on their start tag, whose end tag may still follow
+        self.closed_void_elements = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            self.closed_void_elements.append(tag)
+            return
+        element = [tag, None, False]
+        if tag in TABLE_TAGS:
+            self.table_depth += 1
+        elif tag in HIDDEN_TAGS:
+            self.hidden_depth += 1
+        elif self.table_depth == 0 and tag in BLOCK_TAGS:
+            if self.open_blocks:
+                self.open_blocks[-1][2] = False
+            element = [tag, [], True]
+            self.open_blocks.append(element)
+        self.open_elements.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag not in VOID_TAGS:
+            self.handle_starttag(tag, attrs)
+            self.close_element()
+
+    def handle_endtag(self, tag):
+        if tag in self.closed_void_elements:
+            self.closed_void_elements.remove(tag)
+            return
+        # like BeautifulSoup, an end tag is ignored when its element is not open
+        for position in range(len(self.open_elements) - 1, -1, -1):
+            if self.open_elements[position][0] == tag:
+                while len(self.open_elements) > position:
+                    self.close_element()
+                break
+
+    def handle_data(self, data):
+        if self.table_depth == 0 and self.hidden_depth == 0 and self.open_blocks:
+            self.open_blocks[-1][1].append(data)
+
+    def close_element(self):
+        tag, parts, leaf = element = self.open_elements.pop()
+        if tag in TABLE_TAGS:
+            self.table_depth -= 1
+        elif tag in HIDDEN_TAGS:
+            self.hidden_depth -= 1
+        elif parts is not None:
+            self.open_blocks.pop()
+            if leaf:
+                self.blocks.append((tag, ''.join(parts)))
+
+    def extract(self, markup):
+        self.feed(markup)
+        self.close()
+        while self.open_elements:
+            self.close_element()
+        return self.blocks
+
+
+def extract_epub_contents_with_soup(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for s in soup.find_all(TABLE_TAGS):
+        s.extract()
+    cc = soup.find_all(BLOCK_TAGS)
+    contents = []
+    for content in cc:
+        if content.find_all(BLOCK_TAGS):
+            continue
+        contents.append((content.name, content.get_text()))
+    return contents
+
+
+def extract_epub_contents(item):
+    html = item.get_content()
+    try:
+        return BlockExtractor().extract(html.decode('utf-8') if isinstance(html, bytes) else html)
+    except (UnicodeDecodeError, AssertionError):
+        # BeautifulSoup detects other encodings and recovers from markup HTMLParser gives up on
+        logging.info(f"Falling back to BeautifulSoup for {item.get_name()}")
+        return extract_epub_contents_with_soup(html)
+
+
+def extract_pdf_page(page):
+    lines = page.extract_text_simple(x_tolerance=1, y_tolerance=3).replace('ﬁ', 'fi').split('\n')
+    start_token = 0
+    token_number = 0
+    paragraphs = []
+    current_paragraph = ""
+    for line in lines:
+        current_paragraph += html.escape(line, quote=False)
+        if len(line) < 48:
+            # new paragraph
+            paragraphs.append((current_paragraph, "p", "none"))
+            current_paragraph = ""
+            token_number += 1
+    if current_paragraph:
+        paragraphs.append((current_paragraph, "p", "none"))
+    return paragraphs, token_number, start_token, token_number
+
+
+def create_ssml_strings_for_pdf(file, item_page, num_tokens):
+    import pdfplumber
+
+    pdf = pdfplumber.open(file)
+    ssml_strings = []
+    for page in pdf.pages[item_page:item_page+num_tokens]:
+        ssml_strings.append(extract_pdf_page(page))
+    pdf.close()
+    return ssml_strings
+
+
+def create_ssml_strings(contents, num_tokens, chunker=None):
+    def reset_ssml_string():
+        nonlocal curr_ssml_string, current_token_number_inside_index, token_number, current_chars_inside_index
+        if current_token_number_inside_index < 1:
+            return
+        if curr_ssml_string is None:
+            return
+        ssml_strings.append((curr_ssml_string, current_token_number_inside_index, token_number,
+                             token_number + current_token_number_inside_index))
+        curr_ssml_string = []
+        token_number += current_token_number_inside_index
+        current_token_number_inside_index = 0
+        current_chars_inside_index = 0
+        if chunker:
+            chunker.next_chunk()
+
+    token_number = 0
+    ssml_strings = []
+    current_token_number_inside_index = 0
+    current_chars_inside_index = 0
+    curr_ssml_string = []
+    if chunker:
+        chunker.restart()
+
+    for name, text in contents:
+        text = html.escape(text, quote=False)
+
+        if name.startswith('h1'):
+            doc_tag = "s"
+            emphasis_level = "strong"
+            reset_ssml_string()
+            if chunker:
+                # a new chapter starts small again
+                chunker.restart()
+        elif name.startswith('h2') or name.startswith('h3'):
+            doc_tag = "s"
+            emphasis_level = "moderate"
+            reset_ssml_string()
+        else:
+            doc_tag = "p"
+            emphasis_level = "none"
+
+        if current_token_number_inside_index >= num_tokens:
+            reset_ssml_string()
+        if text == '':
+            reset_ssml_string()
+            continue
+        if len(text.split()) < 1:
+            continue
+        if chunker:
+            pieces = chunker.split_first(current_chars_inside_index, text)
+            if pieces:
+                head, text = pieces
+                curr_ssml_string.append((head, doc_tag, emphasis_level))
+                current_token_number_inside_index += 1
+                reset_ssml_string()
+            elif not chunker.fits(current_chars_inside_index, text):
+                reset_ssml_string()
+        token_string = (text, doc_tag, emphasis_level)
+        curr_ssml_string.append(token_string)
+        current_token_number_inside_index += 1
+        current_chars_inside_index += len(text)
+
+    if curr_ssml_string:
+        ssml_strings.append((curr_ssml_string, current_token_number_inside_index, token_number,
+                             token_number + current_token_number_inside_index))
+        current_token_number_inside_index += 1
+
+    return ssml_strings
+
+
+def create_final_ssml_string(ssml_string, voice, style, speed):
+    header = f"""<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xmlns:mstts="https://www.w3.org/2001/mstts" xml:lang="en-US"><voice name="{voice}">"""
+    footer = """</voice></speak>"""
+    final_string = header
+    for text, doc_tag, emphasis_level in ssml_string:
+        text = text.replace('\n', ' ')
+        if style != 'default':
+            final_string += f"""<{doc_tag}><mstts:express-as style="{style}"><prosody rate="{speed}"><emphasis level="{emphasis_level}">{text}</emphasis></prosody></mstts:express-as></{doc_tag}>"""
+        else:
+            final_string += f"""<{doc_tag}><prosody rate="{speed}"><emphasis level="{emphasis_level}">{text}</emphasis></prosody></{doc_tag}>"""
+    final_string += footer
+    return final_string
+
+
+def create_final_ssml_strings(ssml_strings, voice, style, speed):
+    final_ssml_strings = []
+    for ssml_string, total_tokens, start_token, end_token in ssml_strings:
+        final_ssml_strings.append((create_final_ssml_string(ssml_string, voice, style, speed), total_tokens,
+                                   start_token, end_token,))
+    return final_ssml_strings
+
+
+def is_ready(ssml_strings, index):
+    # lazily extracted indices tell whether reading one would wait, lists are always ready
+    return not hasattr(ssml_strings, 'ready') or ssml_strings.ready(index)
+
+
+def has_index(ssml_strings, index):
+    # a book index parses forward to find out
+    if hasattr(ssml_strings, 'has_index'):
+        return ssml_strings.has_index(index)
+    return 0 <= index < len(ssml_strings)
+
+
+def may_have_index(ssml_strings, index):
+    # like has_index without parsing anything, so it is cheap enough for the Tk thread
+    if hasattr(ssml_strings, 'may_have_index'):
+        return ssml_strings.may_have_index(index)
+    return 0 <= index < len(ssml_strings)
+
+
+class FinalSsmlStrings(Sequence):
+    # create_final_ssml_strings for one index at a time, when it is read
+    def __init__(self, ssml_strings, voice, style, speed):
+        self.ssml_strings = ssml_strings
+        self.voice = voice
+        self.style = style
+        self.speed = speed
+
+    def ready(self, index):
+        return is_ready(self.ssml_strings, index)
+
+    def has_index(self, index):
+        return has_index(self.ssml_strings, index)
+
+    def may_have_index(self, index):
+        return may_have_index(self.ssml_strings, index)
+
+    def __len__(self):
+        return len(self.ssml_strings)
+
+    def timed(self, index):
+        # the index with the milliseconds spent getting its text from the book and building its SSML
+        start = time.monotonic()
+        ssml_string, total_tokens, start_token, end_token = self.ssml_strings[index]
+        extracted = time.monotonic()
+        final_ssml_string = create_final_ssml_string(ssml_string, self.voice, self.style, self.speed)
+        built = time.monotonic()
+        return ((final_ssml_string, total_tokens, start_token, end_token,), round((extracted - start) * 1000, 3),
+                round((built - extracted) * 1000, 3))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.timed(index)[0]
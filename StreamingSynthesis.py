@@ -0,0 +1,125 @@
+import os
+import threading
+
+from Synthesis import compute_word_timings
+
+
+class SynthesisStream:
+    # Audio chunks and word boundaries of one index as the service produces them. Written from the synthesis
+    # worker thread and read from the Tk thread.
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.audio = bytearray()
+        self.words_with_offset = []
+        self.audio_duration_ticks = None
+        self.lock = threading.Lock()
+
+    def add_audio(self, audio_data):
+        with self.lock:
+            self.audio.extend(audio_data)
+
+    def add_word(self, audio_offset, text):
+        with self.lock:
+            self.words_with_offset.append((audio_offset, text,))
+
+    def finish(self, audio_duration_ticks):
+        with self.lock:
+            self.audio_duration_ticks = audio_duration_ticks
+
+    @property
+    def completed(self):
+        return self.audio_duration_ticks is not None
+
+    @property
+    def buffered_bytes(self):
+        return len(self.audio)
+
+    def word_timings(self):
+        # a word's duration is only known once the next boundary or the end of the audio has arrived
+        with self.lock:
+            words_with_offset = sorted(self.words_with_offset)
+            audio_duration_ticks = self.audio_duration_ticks
+        if audio_duration_ticks is not None:
+            return compute_word_timings(words_with_offset, audio_duration_ticks)[1]
+        words, offsets_ms, durations_ms = compute_word_timings(words_with_offset, 0)[1]
+        return words[:-1], offsets_ms[:-1], durations_ms[:-1]
+
+    def write_prefix(self, part):
+        # every prefix starts at the beginning of the stream, so positions stay absolute across prefixes
+        with self.lock:
+            audio = bytes(self.audio)
+        prefix_path = f'{os.path.splitext(self.file_path)[0]}-{part}{os.path.splitext(self.file_path)[1]}'
+        with open(prefix_path, 'wb') as f:
+            f.write(audio)
+        return prefix_path, len(audio)
+
+
+class StreamingPlayback:
+    # Plays a SynthesisStream while it is still growing. Whenever the loaded prefix is about to run out, or the
+    # synthesis completes, a longer prefix is loaded and playback seeks back to the same position in it.
+    def __init__(self, stream, bytes_per_ms, guard_seconds):
+        self.stream = stream
+        self.bytes_per_ms = bytes_per_ms
+        self.guard_seconds = guard_seconds
+        self.playback = None
+        self.loaded_bytes = 0
+        self.loaded_complete = False
+        self.parts = 0
+        self.paused = False
+        self.stopped = False
+
+    def load(self, position):
+        complete = self.stream.completed
+        from just_playback import Playback
+
+        prefix_path, self.loaded_bytes = self.stream.write_prefix(self.parts)
+        self.parts += 1
+        playback = Playback()
+        playback.load_file(prefix_path)
+        playback.play()
+        if position:
+            playback.seek(position)
+        if self.playback:
+            self.playback.stop()
+        self.playback = playback
+        self.loaded_complete = complete
+
+    def play(self):
+        self.load(0)
+
+    def advance(self):
+        if self.paused or self.stopped or self.loaded_complete:
+            return
+        if self.stream.buffered_bytes <= self.loaded_bytes and not self.stream.completed:
+            return
+        if self.stream.completed or self.playback.curr_pos >= self.loaded_seconds - self.guard_seconds \
+                or not self.playback.active:
+            self.load(self.curr_pos)
+
+    @property
+    def loaded_seconds(self):
+        # from the byte count, a wav prefix still carries the header size of the complete audio
+        return self.loaded_bytes / self.bytes_per_ms / 1000
+
+    @property
+    def curr_pos(self):
+        if not self.playback.active:
+            # the prefix ran out before more audio arrived
+            return self.loaded_seconds
+        return self.playback.curr_pos
+
+    @property
+    def playing(self):
+        return not self.paused and not self.stopped
+
+    def pause(self):
+        self.paused = True
+        self.playback.pause()
+
+    def resume(self):
+        self.paused = False
+        self.playback.resume()
+
+    def stop(self):
+        self.stopped = True
+        self.playback.stop()
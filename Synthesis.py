@@ -0,0 +1,75 @@
+import logging
+import os
+import random
+import re
+import string
+import time
+from array import array
+
+from SynthesisCache import SynthesisCache
+
+SSML_TAG = re.compile(r'<[^>]+>')
+TICKS_PER_MICROSECOND = 10
+TICKS_PER_MS = 1000 * TICKS_PER_MICROSECOND
+HALF_TICK_MS = TICKS_PER_MS // 2
+
+
+def generate_filename():
+    letters = string.ascii_lowercase
+    filename = ''.join(random.choice(letters) for _ in range(10))
+    return filename
+
+
+def compute_word_timing_arrays(offset_ticks, audio_duration_ticks):
+    # offsets are sorted 100-ns ticks. The first word lasts from the start of the audio to the second offset, every
+    # other word to the next offset and the last one to the end of the audio, all rounded to whole milliseconds.
+    count = len(offset_ticks)
+    offsets_ms = array('q', ((ticks + HALF_TICK_MS) // TICKS_PER_MS for ticks in offset_ticks))
+    durations_ms = array('q', bytes(8 * count))
+    for i in range(count - 1):
+        start_ticks = offset_ticks[i] if i else 0
+        durations_ms[i] = (offset_ticks[i + 1] - start_ticks + HALF_TICK_MS) // TICKS_PER_MS
+    if count:
+        start_ticks = offset_ticks[-1] if count > 1 else offset_ticks[0]
+        durations_ms[-1] = (audio_duration_ticks - start_ticks + HALF_TICK_MS) // TICKS_PER_MS
+    return offsets_ms, durations_ms
+
+
+def compute_word_timings(words_with_offset, audio_duration_ticks):
+    # the audio duration in milliseconds and the word timings: the words, their offsets and their durations, the
+    # timings in millisecond arrays that Words keeps as they are
+    offset_ticks = array('q', (offset for offset, word in words_with_offset))
+    offsets_ms, durations_ms = compute_word_timing_arrays(offset_ticks, audio_duration_ticks)
+    words = [word for offset, word in words_with_offset]
+    return (audio_duration_ticks + HALF_TICK_MS) // TICKS_PER_MS, (words, offsets_ms, durations_ms)
+
+
+def synthesize(ssml_string, tts_backend, synthesis_cache, tmp_dir, voice, style, speed, stream=None,
+               synthesis_stats=None, timings=None, pin=False):
+    # timings, when given, is filled with cache_hit, synthesis_ms and first_byte_ms. With pin the returned audio is
+    # kept from eviction until it is released with synthesis_cache.release().
+    start = time.monotonic()
+    cache_key = SynthesisCache.make_key(ssml_string, voice, style, speed, tts_backend.output_format)
+    cached = synthesis_cache.get(cache_key, pin)
+    if cached:
+        logging.info(f"Cache hit {cached[0]}")
+        if timings is not None:
+            timings.update(cache_hit=True, synthesis_ms=round((time.monotonic() - start) * 1000, 1),
+                           first_byte_ms=None)
+        return cached
+    file_path = os.path.join(tmp_dir, f'{generate_filename()}{tts_backend.audio_extension}')
+    logging.info(file_path)
+    start = time.monotonic()
+    # the backend reports when the first audio arrived, the stream is handed over as the caller passed it
+    first_audio_at = []
+    on_first_audio = (lambda: first_audio_at.append(time.monotonic())) if timings is not None else None
+    audio_data, milliseconds_audio_duration, word_timings = tts_backend.synthesize(ssml_string, stream, on_first_audio)
+    if timings is not None:
+        timings.update(cache_hit=False, synthesis_ms=round((time.monotonic() - start) * 1000, 1),
+                       first_byte_ms=round((first_audio_at[0] - start) * 1000, 1) if first_audio_at else None)
+    if synthesis_stats:
+        synthesis_stats.record(len(SSML_TAG.sub('', ssml_string)), (time.monotonic() - start) * 1000,
+                               milliseconds_audio_duration)
+    with open(file_path, 'wb') as f:
+        f.write(audio_data)
+    return synthesis_cache.put(cache_key, file_path, milliseconds_audio_duration, word_timings, pin)
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from array import array
+
+import AppData
+
+ORPHAN_MIN_AGE_SECONDS = 60
+
+
+class SynthesisCache:
+    # Content-addressed store of synthesized indices. Each entry is an audio file plus a json file holding the
+    # audio duration and the word timings. The json file's mtime is the last access time used for LRU eviction.
+    # Entries handed out with pin=True are not evicted until they are released, so audio waiting to be played stays.
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.entries = {}
+        # key -> number of holders
+        self.pinned = {}
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                key = name[:-len('.json')]
+                meta_path = os.path.join(self.directory, name)
+                try:
+                    with open(meta_path) as f:
+                        audio_name = json.load(f)['audio']
+                    size = os.path.getsize(meta_path) + os.path.getsize(os.path.join(self.directory, audio_name))
+                    self.entries[key] = (size, os.path.getmtime(meta_path), audio_name)
+                except (OSError, ValueError, KeyError):
+                    logging.warning(f"Dropping unreadable cache entry {key}")
+                    self._remove(key)
+        self._sweep()
+
+    @staticmethod
+    def make_key(ssml_string, voice, style, speed, output_format):
+        key_source = json.dumps([ssml_string, voice, style, speed, output_format])
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _sweep(self):
+        # audio without a json file, left by a crash between writing the two or a failed removal, is never counted
+        # against the budget, remove it along with half written json files. Recent files may belong to a put of
+        # another process, e.g. BatchRender, sharing the directory.
+        referenced = {audio_name for size, last_used, audio_name in self.entries.values()}
+        for name in os.listdir(self.directory):
+            if name.endswith('.json') or name in referenced:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if time.time() - os.path.getmtime(path) < ORPHAN_MIN_AGE_SECONDS:
+                    continue
+                logging.info(f"Removing orphaned cache file {name}")
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _remove(self, key):
+        size, last_used, audio_name = self.entries.pop(key, (0, 0, None))
+        for name in (f'{key}.json', audio_name):
+            if name is None:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                # missing, or still open by the player on some platforms
+                pass
+
+    def contains(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key, pin=False):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            meta_path = self._meta_path(key)
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                now = time.time()
+                os.utime(meta_path, (now, now))
+            except (OSError, ValueError):
+                self._remove(key)
+                self.misses += 1
+                return None
+            if 'words_offset_duration' in meta:
+                # written before the word timings were stored as separate lists
+                legacy = meta['words_offset_duration']
+                meta.update(words=[word for word, offset, duration in legacy],
+                            offsets_ms=[offset for word, offset, duration in legacy],
+                            durations_ms=[duration for word, offset, duration in legacy])
+            size, last_used, audio_name = self.entries[key]
+            self.entries[key] = (size, now, audio_name)
+            self.hits += 1
+            if pin:
+                self._pin(key)
+        word_timings = meta['words'], array('q', meta['offsets_ms']), array('q', meta['durations_ms'])
+        return os.path.join(self.directory, meta['audio']), meta['milliseconds_audio_duration'], word_timings
+
+    def put(self, key, audio_path, milliseconds_audio_duration, word_timings, pin=False):
+        words, offsets_ms, durations_ms = word_timings
+        audio_name = f'{key}{os.path.splitext(audio_path)[1]}'
+        cached_audio_path = os.path.join(self.directory, audio_name)
+        meta_path = self._meta_path(key)
+        with self.lock:
+            shutil.move(audio_path, cached_audio_path)
+            with AppData.atomic_write(meta_path) as f:
+                json.dump({'audio': audio_name,
+                           'milliseconds_audio_duration': milliseconds_audio_duration,
+                           'words': words, 'offsets_ms': offsets_ms.tolist(), 'durations_ms': durations_ms.tolist()}, f)
+            self.entries[key] = (os.path.getsize(meta_path) + os.path.getsize(cached_audio_path), time.time(),
+                                 audio_name)
+            if pin:
+                self._pin(key)
+            self._evict(keep=key)
+        return cached_audio_path, milliseconds_audio_duration, word_timings
+
+    def _pin(self, key):
+        self.pinned[key] = self.pinned.get(key, 0) + 1
+
+    def release(self, audio_path):
+        # undoes one pin=True of the entry whose audio is at audio_path
+        key = os.path.splitext(os.path.basename(audio_path))[0]
+        with self.lock:
+            count = self.pinned.pop(key, 0) - 1
+            if count > 0:
+                self.pinned[key] = count
+
+    def _evict(self, keep):
+        total_bytes = sum(entry[0] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k][1]):
+            if total_bytes <= self.max_bytes:
+                break
+            if key == keep or key in self.pinned:
+                continue
+            total_bytes -= self.entries[key][0]
+            logging.info(f"Evicting cache entry {key}")
+            self._remove(key)
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'pinned': len(self.pinned),
+                    'bytes': sum(entry[0] for entry in self.entries.values()), 'max_bytes': self.max_bytes}
@@ -0,0 +1,44 @@
+import json
+import threading
+
+import AppData
+
+
+class SynthesisStats:
+    # Moving averages of synthesis latency and playback length per text character, kept across sessions.
+    # Only real service round-trips are recorded, cache hits would make synthesis look free.
+    def __init__(self, path, smoothing=0.2):
+        self.path = path
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.synthesis_ms_per_char = None
+        self.playback_ms_per_char = None
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.synthesis_ms_per_char = data['synthesis_ms_per_char']
+            self.playback_ms_per_char = data['playback_ms_per_char']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _smooth(self, average, value):
+        if average is None:
+            return value
+        return average + self.smoothing * (value - average)
+
+    def record(self, num_chars, synthesis_ms, playback_ms):
+        if num_chars <= 0:
+            return
+        with self.lock:
+            self.synthesis_ms_per_char = self._smooth(self.synthesis_ms_per_char, synthesis_ms / num_chars)
+            self.playback_ms_per_char = self._smooth(self.playback_ms_per_char, playback_ms / num_chars)
+            with AppData.atomic_write(self.path) as f:
+                json.dump({'synthesis_ms_per_char': self.synthesis_ms_per_char,
+                           'playback_ms_per_char': self.playback_ms_per_char}, f)
+
+    def playback_to_synthesis_ratio(self):
+        # how many characters can be synthesized while one character plays
+        with self.lock:
+            if not self.synthesis_ms_per_char or not self.playback_ms_per_char:
+                return None
+            return self.playback_ms_per_char / self.synthesis_ms_per_char
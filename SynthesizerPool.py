@@ -0,0 +1,80 @@
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+import azure.cognitiveservices.speech as speechsdk
+
+OUTPUT_FORMAT = speechsdk.SpeechSynthesisOutputFormat.Audio16Khz128KBitRateMonoMp3
+OUTPUT_BYTES_PER_MS = 128 * 1000 // 8 // 1000
+
+
+class SynthesizerPool:
+    # Long-lived SpeechSynthesizers sharing one SpeechConfig. Each synthesizer keeps its service connection open,
+    # so only the first request on it pays the TLS/websocket handshake. A synthesizer is used by one caller at a time.
+    def __init__(self, speech_key, speech_region, output_format=OUTPUT_FORMAT, size=2):
+        self.speech_key = speech_key
+        self.speech_region = speech_region
+        self.size = size
+        self.speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
+        self.speech_config.set_speech_synthesis_output_format(output_format)
+        self.idle = queue.LifoQueue()
+        self.connections = {}
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def matches(self, speech_key, speech_region):
+        return not self.closed and self.speech_key == speech_key and self.speech_region == speech_region
+
+    def create_synthesizer(self):
+        # audio_config=None keeps the audio in result.audio_data, so the same synthesizer can serve every index
+        synthesizer = speechsdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=None)
+        connection = speechsdk.Connection.from_speech_synthesizer(synthesizer)
+        connection.open(True)
+        with self.lock:
+            self.connections[id(synthesizer)] = connection
+        return synthesizer
+
+    def warm_up(self):
+        def open_synthesizers():
+            for _ in range(self.size - self.idle.qsize()):
+                try:
+                    self.idle.put(self.create_synthesizer())
+                except RuntimeError:
+                    logging.exception("Could not pre-open a speech synthesizer connection")
+                    return
+            logging.info(f"Synthesizer pool warmed up with {self.idle.qsize()} connections")
+
+        threading.Thread(target=open_synthesizers, name="synthesizer-warm-up", daemon=True).start()
+
+    @contextmanager
+    def acquire(self):
+        try:
+            synthesizer = self.idle.get_nowait()
+        except queue.Empty:
+            synthesizer = self.create_synthesizer()
+        try:
+            yield synthesizer
+        finally:
+            # handlers are scoped to a single request, never let them leak into the next user of the synthesizer
+            synthesizer.synthesis_word_boundary.disconnect_all()
+            synthesizer.synthesizing.disconnect_all()
+            synthesizer.synthesis_completed.disconnect_all()
+            if self.closed:
+                self.discard(synthesizer)
+            else:
+                self.idle.put(synthesizer)
+
+    def discard(self, synthesizer):
+        with self.lock:
+            connection = self.connections.pop(id(synthesizer), None)
+        if connection:
+            connection.close()
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
@@ -0,0 +1,26 @@
+class TTSBackend:
+    # What the reader needs from a text-to-speech service. synthesize() returns the audio bytes, the audio duration
+    # in milliseconds and the word timings as compute_word_timings returns them, and feeds `stream` as audio and
+    # words arrive. It calls on_first_audio, when given, once the first audio arrives, with or without a stream.
+    # list_voices() returns (short_name, locale, style_list) tuples, or None when the credentials are rejected.
+    name = None
+    output_format = None
+    audio_extension = None
+    bytes_per_ms = None
+    speech_key = ""
+    speech_region = ""
+
+    def matches(self, speech_key, speech_region):
+        return self.speech_key == speech_key and self.speech_region == speech_region
+
+    def warm_up(self):
+        pass
+
+    def close(self):
+        pass
+
+    def list_voices(self):
+        raise NotImplementedError
+
+    def synthesize(self, ssml_string, stream=None, on_first_audio=None):
+        raise NotImplementedError
@@ -0,0 +1,64 @@
+import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualList(ttk.Frame):
+    # A list of `count` rows whose Listbox only ever holds the visible ones. Rows are formatted by line(position) when
+    # they scroll into view, and a selected row is reported to on_select(position).
+    def __init__(self, master, count, line, on_select, width=50, height=50):
+        super().__init__(master)
+        self.count = count
+        self.line = line
+        self.on_select = on_select
+        self.rows = max(1, min(count, height))
+        self.top = 0
+        self.listbox = tk.Listbox(self, width=width, height=self.rows, exportselection=False)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.listbox.grid(row=0, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        self.listbox.bind("<<ListboxSelect>>", self.selected)
+        self.listbox.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1))
+        self.listbox.bind("<Button-4>", lambda event: self.scroll(-1))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll(1))
+        self.listbox.bind("<Prior>", lambda event: self.scroll(-self.rows))
+        self.listbox.bind("<Next>", lambda event: self.scroll(self.rows))
+        self.render()
+
+    def set_count(self, count):
+        self.count = count
+        self.top = max(0, min(self.top, count - self.rows))
+        self.render()
+
+    def render(self):
+        self.listbox.delete(0, tk.END)
+        for position in range(self.top, min(self.top + self.rows, self.count)):
+            self.listbox.insert(tk.END, self.line(position))
+        if self.count:
+            self.scrollbar.set(self.top / self.count, min(self.count, self.top + self.rows) / self.count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll_to(self, top):
+        top = max(0, min(top, self.count - self.rows))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def scroll(self, rows):
+        self.scroll_to(self.top + rows)
+        return "break"
+
+    def yview(self, *args):
+        if args[0] == tk.MOVETO:
+            self.scroll_to(round(float(args[1]) * self.count))
+        elif args[2] == tk.PAGES:
+            self.scroll(int(args[1]) * self.rows)
+        else:
+            self.scroll(int(args[1]))
+
+    def selected(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self.on_select(self.top + selection[0])
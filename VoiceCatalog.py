@@ -0,0 +1,68 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import AppData
+
+
+class VoiceCatalog:
+    # Voice list of one speech region of one TTS backend persisted on disk, so the configuration screens can read it
+    # instantly. Refreshes run on a background thread; the screens poll the returned future from the Tk main loop.
+    def __init__(self, directory, backend_name, region, ttl_seconds):
+        self.backend_name = backend_name
+        self.region = region
+        self.ttl_seconds = ttl_seconds
+        # the fake backend's voices must never replace the real ones of a region
+        self.path = os.path.join(directory, f'{backend_name}-{region or "default"}.json')
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="voice-catalog")
+        self.refreshing = None
+        self.fetched_at = 0
+        self.key_hash = None
+        self.voices = []
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.fetched_at = data['fetched_at']
+            self.key_hash = data['key_hash']
+            self.voices = [tuple(voice) for voice in data['voices']]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @staticmethod
+    def hash_key(speech_key):
+        return hashlib.sha256(speech_key.encode('utf-8')).hexdigest()
+
+    def is_stale(self):
+        return time.time() - self.fetched_at > self.ttl_seconds
+
+    def validated_for(self, speech_key):
+        return bool(self.voices) and self.key_hash == self.hash_key(speech_key)
+
+    def get_voices(self):
+        with self.lock:
+            return list(self.voices)
+
+    def refresh(self, tts_backend):
+        if tts_backend.name != self.backend_name:
+            raise ValueError(f"The voice catalog of {self.backend_name} cannot be refreshed from {tts_backend.name}")
+        voices = tts_backend.list_voices()
+        if voices is None:
+            return False
+        with self.lock:
+            self.voices = voices
+            self.fetched_at = time.time()
+            self.key_hash = self.hash_key(tts_backend.speech_key)
+            with AppData.atomic_write(self.path) as f:
+                json.dump({'fetched_at': self.fetched_at, 'key_hash': self.key_hash, 'voices': self.voices}, f)
+        logging.info(f"Voice catalog of {self.backend_name} for {self.region} refreshed with {len(voices)} voices")
+        return True
+
+    def refresh_async(self, tts_backend):
+        if self.refreshing is None or self.refreshing.done():
+            self.refreshing = self.executor.submit(self.refresh, tts_backend)
+        return self.refreshing
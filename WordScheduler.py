@@ -0,0 +1,93 @@
+import time
+from bisect import bisect_right
+
+# a frame that fires this much before its word is spoken waits for the audio instead of showing the word early
+HOLD_MS = 20
+
+
+class WordScheduler:
+    # Keeps the displayed word locked to the audio. The word being spoken is found by binary search of the playback
+    # position over the word offsets, and every frame is due at a monotonic deadline computed from that position,
+    # so drift never builds up across an index or a pause. A profiler, when given, is told about every frame.
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.deadline = None
+        self.started_at = None
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.timed_frames = 0
+        self.skipped = 0
+        self.held = 0
+        self.total_drift_ms = 0
+        self.max_drift_ms = 0
+        self.total_lateness_ms = 0
+        self.max_lateness_ms = 0
+
+    @staticmethod
+    def word_at(words, position_ms):
+        return max(0, bisect_right(words.offsets, position_ms) - 1)
+
+    def cancel(self):
+        # the pending frame will not fire, e.g. on pause, so it must not count as late
+        self.deadline = None
+
+    def locate(self, words, word_index, position_ms):
+        # returns the word to display now, or None to hold the frame until the audio reaches word_index
+        self.started_at = time.monotonic()
+        scheduled_at = self.deadline
+        if self.deadline is not None:
+            lateness_ms = (self.started_at - self.deadline) * 1000
+            self.timed_frames += 1
+            self.total_lateness_ms += lateness_ms
+            self.max_lateness_ms = max(self.max_lateness_ms, lateness_ms)
+            self.deadline = None
+        if position_ms is None:
+            self.profile(scheduled_at, position_ms, words, word_index, 'untimed')
+            return word_index
+        if words.offsets[word_index] - position_ms > HOLD_MS:
+            self.held += 1
+            self.profile(scheduled_at, position_ms, words, word_index, 'held')
+            return None
+        spoken_index = self.word_at(words, position_ms)
+        if spoken_index > word_index:
+            self.skipped += spoken_index - word_index
+            # the skipped words are frames that were never shown
+            for skipped_index in range(word_index, spoken_index):
+                self.profile(scheduled_at, position_ms, words, skipped_index, 'skipped')
+            word_index = spoken_index
+        drift_ms = position_ms - words.offsets[word_index]
+        self.frames += 1
+        self.total_drift_ms += abs(drift_ms)
+        self.max_drift_ms = max(self.max_drift_ms, abs(drift_ms))
+        self.profile(scheduled_at, position_ms, words, word_index, 'shown')
+        return word_index
+
+    def profile(self, scheduled_at, position_ms, words, word_index, action):
+        if self.profiler:
+            self.profiler.frame(scheduled_at, self.started_at, position_ms, word_index, words.offsets[word_index],
+                                action)
+
+    def schedule(self, words, word_index, position_ms):
+        # milliseconds until word_index is due, counted from the start of the frame so rendering time is not added
+        if position_ms is None:
+            # the audio has ended, fall back to the word durations
+            delay_ms = words.times[word_index - 1] if word_index else 0
+        elif word_index < len(words):
+            delay_ms = words.offsets[word_index] - position_ms
+        else:
+            delay_ms = words.offsets[-1] + words.times[-1] - position_ms
+        self.deadline = self.started_at + max(0, delay_ms) / 1000
+        return max(1, round((self.deadline - time.monotonic()) * 1000))
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'held': self.held,
+            'mean_drift_ms': round(self.total_drift_ms / self.frames, 1) if self.frames else 0,
+            'max_drift_ms': self.max_drift_ms,
+            'mean_lateness_ms': round(self.total_lateness_ms / self.timed_frames, 1) if self.timed_frames else 0,
+            'max_lateness_ms': round(self.max_lateness_ms, 1),
+        }
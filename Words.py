@@ -1,26 +1,56 @@
+from array import array
+
+
 class Words:
-    def __init__(self):
-        self.words_list = []
-        self.words_offset_list = []
-        self.words_time_list = []
-        self.left_words_list = []
-        self.right_words_list = []
-        self.previous_words_list = []
-        self.forward_words_list = []
-
-    def append(self, word, offset, time, left_words, right_words, previous_words, forward_words):
-        self.words_list.append(word)
-        self.words_offset_list.append(offset)
-        self.words_time_list.append(time)
-        self.left_words_list.append(left_words)
-        self.right_words_list.append(right_words)
-        self.previous_words_list.append(previous_words)
-        self.forward_words_list.append(forward_words)
+    # All words of an index joined once into `text`, with each word's character span and timing in flat arrays.
+    # The context windows around a word are slices of `text`, computed when the word is displayed.
+    __slots__ = ('text', 'starts', 'ends', 'offsets', 'times', 'num_words_in_center_text')
+
+    def __init__(self, word_timings=((), (), ()), num_words_in_center_text=5):
+        # word_timings as compute_word_timings returns them, its offset and duration arrays are kept without a copy
+        words, offsets, times = word_timings
+        self.num_words_in_center_text = num_words_in_center_text
+        self.text = ' '.join(words)
+        self.starts = array('l')
+        self.ends = array('l')
+        self.offsets = offsets if isinstance(offsets, array) else array('q', offsets)
+        self.times = times if isinstance(times, array) else array('q', times)
+        position = 0
+        for word in words:
+            self.starts.append(position)
+            position += len(word)
+            self.ends.append(position)
+            position += 1
+
+    def join(self, start, end):
+        # same as ' '.join(words[start:end])
+        if end <= start:
+            return ''
+        return self.text[self.starts[start]:self.ends[end - 1]]
+
+    def word(self, index):
+        return self.text[self.starts[index]:self.ends[index]]
+
+    def center(self, index):
+        # only what the center line needs, without the context panes
+        n = self.num_words_in_center_text
+        left_words = self.join(max(0, index - n), index)
+        right_words = self.join(index + 1, min(index + n, len(self.starts)))
+        return self.word(index), self.offsets[index], self.times[index], left_words, right_words
 
     def __getitem__(self, index):
-        return (self.words_list[index], self.words_offset_list[index], self.words_time_list[index],
-                self.left_words_list[index], self.right_words_list[index],
-                self.previous_words_list[index], self.forward_words_list[index])
+        n = self.num_words_in_center_text
+        length = len(self.starts)
+        left_words = self.join(max(0, index - n), index)
+        previous_words = self.join(0, index - n) if index - n >= 0 else None
+        if index + n < length:
+            right_words = self.join(index + 1, index + n)
+            forward_words = self.join(index + n, length)
+        else:
+            right_words = self.join(index + 1, length)
+            forward_words = None
+        return (self.word(index), self.offsets[index], self.times[index], left_words, right_words, previous_words,
+                forward_words)
 
     def __len__(self):
-        return len(self.words_list)
\ No newline at end of file
+        return len(self.starts)
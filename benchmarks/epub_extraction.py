@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SsmlStrings import BlockExtractor, extract_epub_contents_with_soup  # noqa: E402
+# markup both extractors must read the same way: unclosed blocks, stray and void end tags, hidden text
+MALFORMED = [
+    "<div><p>Lost text</div><div><p>Kept</p></div>",
+    "<p>x<script>y</script></p><p>a<style>b</style>c</p>",
+    "<p>ruby<rt>annotation</rt><rp>(</rp></p><template><p>hidden</p></template>",
+    "<li>first<li>second</li><p>a<br>b</br><img src='c.png'>d</p>",
+    "<p>a</span>b</p><br><table><tr><td><p>cell</td></tr></table><p>after</p>",
+    "<h1>unclosed heading<p>and paragraph",
+]
+
+
+def make_chapter(paragraphs, depth):
+    # XHTML shaped like the large chapters that are slow to extract: paragraphs inside deeply nested containers
+    # plus lists and a table that must be skipped
+    sentence = "The <i>quick</i> brown fox jumps over the lazy dog &amp; keeps running. "
+    opening = "<div><section><blockquote>" * depth
+    closing = "</blockquote></section></div>" * depth
+    body = []
+    for i in range(paragraphs):
+        if i % 50 == 0:
+            body.append(f"<h2>Section {i // 50}</h2>")
+        if i % 20 == 0:
+            body.append("<ul><li>first item</li><li>second <b>item</b><ul><li>nested</li></ul></li></ul>")
+        if i % 100 == 0:
+            body.append("<table><tr><td><p>cell</p></td><td>value</td></tr></table>")
+        body.append(f"<p>{sentence * 4}</p>")
+    return (f"<?xml version='1.0' encoding='utf-8'?><html xmlns='http://www.w3.org/1999/xhtml'><head><title>Chapter"
+            f"</title></head><body><h1>Chapter</h1>{opening}{''.join(body)}{closing}</body></html>")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the single-pass EPUB extractor with BeautifulSoup")
+    parser.add_argument("--paragraphs", type=int, nargs='+', default=[500, 2000, 5000])
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for markup in MALFORMED:
+        assert BlockExtractor().extract(markup) == extract_epub_contents_with_soup(markup), markup
+    for paragraphs in args.paragraphs:
+        chapter = make_chapter(paragraphs, args.depth)
+        assert BlockExtractor().extract(chapter) == extract_epub_contents_with_soup(chapter)
+        single_pass = min(timeit.repeat(lambda: BlockExtractor().extract(chapter), number=1, repeat=args.repeat))
+        soup = min(timeit.repeat(lambda: extract_epub_contents_with_soup(chapter), number=1, repeat=args.repeat))
+        print(f"{paragraphs} paragraphs, {len(chapter) // 1024} KiB: single pass {single_pass * 1000:.1f} ms, "
+              f"BeautifulSoup {soup * 1000:.1f} ms, {soup / single_pass:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+import tracemalloc
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AdaptiveChunker import AdaptiveChunker  # noqa: E402
+from SsmlStrings import FinalSsmlStrings, create_ssml_strings  # noqa: E402
+from Synthesis import TICKS_PER_MS, compute_word_timings  # noqa: E402
+from Words import Words  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'hot_paths.json')
+# the best of fewer runs is too noisy to compare against a baseline, or to record one
+MIN_REPEAT = 5
+# a case regresses when it exceeds tolerance x its baseline plus this much, so jitter in tiny cases never fails a run
+NOISE_FLOOR = {'ms': 1.0, 'peak_kib': 16.0}
+WORDS = ("the quick brown fox jumps over lazy dog while reading rapidly through every chapter of a long book and "
+         "keeps going").split()
+
+
+def make_contents(paragraphs, seed=1):
+    # (name, text) pairs as the EPUB extractor yields them: a chapter heading, section headings and paragraphs
+    rng = random.Random(seed)
+    contents = [('h1', 'Chapter')]
+    for i in range(paragraphs):
+        if i % 50 == 0:
+            contents.append(('h2', f'Section {i // 50}'))
+        contents.append(('p', ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))) + '.'))
+    return contents
+
+
+def make_word_boundaries(count, seed=1):
+    # (audio offset in ticks, word) as the service reports them, about 180 ms per word
+    rng = random.Random(seed)
+    offset = 0
+    events = []
+    for _ in range(count):
+        events.append((offset, rng.choice(WORDS)))
+        offset += rng.randint(100, 260) * TICKS_PER_MS
+    return events, offset
+
+
+def make_word_timings(count):
+    events, audio_duration_ticks = make_word_boundaries(count)
+    return compute_word_timings(events, audio_duration_ticks)[1]
+
+
+def words_from_tuples(events, audio_duration_ticks):
+    # the path before word timings stayed in arrays: the backend turned them into a (word, offset, duration) tuple per
+    # word, which the cache and Words took apart again. Kept to compare allocations against.
+    words, offsets_ms, durations_ms = compute_word_timings(events, audio_duration_ticks)[1]
+    words_offset_duration = [(word, offset, duration) for word, offset, duration in zip(words, offsets_ms, durations_ms)]
+    return Words(([word for word, offset, duration in words_offset_duration],
+                  array('q', (offset for word, offset, duration in words_offset_duration)),
+                  array('q', (duration for word, offset, duration in words_offset_duration))), 5)
+
+
+def case_create_ssml_strings(paragraphs, adaptive):
+    contents = make_contents(paragraphs)
+    chunker = AdaptiveChunker() if adaptive else None
+    return lambda: create_ssml_strings(contents, 50, chunker)
+
+
+def case_final_ssml_strings(paragraphs):
+    ssml_strings = create_ssml_strings(make_contents(paragraphs), 50)
+    final_ssml_strings = FinalSsmlStrings(ssml_strings, "en-US-AriaNeural", "narration-professional", "1.20")
+    return lambda: [final_ssml_strings[index] for index in range(len(final_ssml_strings))]
+
+
+def case_word_timings(words):
+    events, audio_duration_ticks = make_word_boundaries(words)
+    return lambda: compute_word_timings(events, audio_duration_ticks)
+
+
+def case_generate_words(words):
+    word_timings = make_word_timings(words)
+    return lambda: Words(word_timings, 5)
+
+
+def case_boundaries_to_words(words, tuples):
+    # from the service's word boundaries to the Words of an index, as arrays or through per-word tuples
+    events, audio_duration_ticks = make_word_boundaries(words)
+    if tuples:
+        return lambda: words_from_tuples(events, audio_duration_ticks)
+    return lambda: Words(compute_word_timings(events, audio_duration_ticks)[1], 5)
+
+
+def case_words_getitem(words):
+    indexed = Words(make_word_timings(words), 5)
+    return lambda: [indexed[index] for index in range(len(indexed))]
+
+
+def case_words_center(words):
+    indexed = Words(make_word_timings(words), 5)
+    return lambda: [indexed.center(index) for index in range(len(indexed))]
+
+
+def case_display_word(words):
+    # every frame of an index on a real Tk display, e.g. a headless one under xvfb-run. Returns None without one.
+    import tempfile
+    import tkinter
+
+    os.environ['RAPID_READ_PRO_HOME'] = tempfile.mkdtemp()
+    os.environ['RAPID_READ_PRO_TTS_BACKEND'] = 'fake'
+    os.environ['RAPID_READ_PRO_RESUME'] = '0'
+    import MainApp
+    from RapidReadProApp import RapidReadProApp
+
+    class SilentPlayback:
+        # always exactly at the word being displayed, so every frame shows a word
+        playing = True
+        curr_pos = 0.0
+
+    try:
+        app = MainApp.MainApp()
+    except tkinter.TclError:
+        return None
+    app.ssml_strings = [([('benchmark', 'p', 'none')], 1, 0, 1)]
+    window = RapidReadProApp(app)
+    window.create_widgets()
+    window.pack(fill=tkinter.BOTH, expand=1)
+    app.update()
+    window.word_timings = make_word_timings(words)
+    window.words = window.generate_words()
+    window.center_line.layout(window.words)
+    window.playback = SilentPlayback()
+
+    def run():
+        window.top_range = window.bottom_range = None
+        for word_index in range(len(window.words)):
+            window.playback.curr_pos = window.words.offsets[word_index] / 1000
+            window.display_word(word_index)
+            app.after_cancel(window.display_queue[0])
+            app.update_idletasks()
+
+    return run
+
+
+def cases(sizes, word_counts, display):
+    for paragraphs in sizes:
+        yield f'create_ssml_strings/{paragraphs}', lambda: case_create_ssml_strings(paragraphs, False)
+        yield f'create_ssml_strings_adaptive/{paragraphs}', lambda: case_create_ssml_strings(paragraphs, True)
+        yield f'final_ssml_strings/{paragraphs}', lambda: case_final_ssml_strings(paragraphs)
+    for words in word_counts:
+        yield f'word_timings/{words}', lambda: case_word_timings(words)
+        yield f'generate_words/{words}', lambda: case_generate_words(words)
+        yield f'boundaries_to_words/{words}', lambda: case_boundaries_to_words(words, False)
+        yield f'boundaries_to_words_tuples/{words}', lambda: case_boundaries_to_words(words, True)
+        yield f'words_getitem/{words}', lambda: case_words_getitem(words)
+        yield f'words_center/{words}', lambda: case_words_center(words)
+    if display:
+        yield f'display_word/{word_counts[0]}', lambda: case_display_word(word_counts[0])
+
+
+def measure(run, repeat):
+    seconds = min(timeit.repeat(run, number=1, repeat=repeat))
+    gc.collect()
+    tracemalloc.start()
+    run()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'ms': round(seconds * 1000, 3), 'peak_kib': round(peak_bytes / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and peak memory of the text, timing and layout hot paths")
+    parser.add_argument("--paragraphs", type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument("--words", type=int, nargs='+', default=[500, 2000, 5000])
+    parser.add_argument("--repeat", type=int, default=MIN_REPEAT, help=f"runs per case, at least {MIN_REPEAT}")
+    parser.add_argument("--display", action="store_true", help="also time display_word, needs a display")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store the results in {BASELINE_PATH}")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="fail when a case takes this many times its baseline time or peak memory")
+    args = parser.parse_args()
+    if args.repeat < MIN_REPEAT:
+        print(f"Raising --repeat {args.repeat} to {MIN_REPEAT}, fewer runs report false regressions")
+        args.repeat = MIN_REPEAT
+
+    try:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)['cases']
+    except (OSError, ValueError, KeyError):
+        baseline = {}
+
+    results = {}
+    regressions = []
+    unbaselined = []
+    print(f"{'case':40} {'ms':>10} {'peak KiB':>10} {'baseline ms':>12} {'baseline KiB':>13}")
+    for name, setup in cases(args.paragraphs, args.words, args.display):
+        run = setup()
+        if run is None:
+            print(f"{name:40} skipped, no display")
+            continue
+        result = results[name] = measure(run, args.repeat)
+        base = baseline.get(name)
+        print(f"{name:40} {result['ms']:10.1f} {result['peak_kib']:10.1f} "
+              f"{base['ms'] if base else '':>12} {base['peak_kib'] if base else '':>13}")
+        if not base:
+            unbaselined.append(name)
+            continue
+        for key in ('ms', 'peak_kib'):
+            if result[key] > base[key] * args.tolerance + NOISE_FLOOR[key]:
+                regressions.append(f"{name} {key} {result[key]} > {args.tolerance} x {base[key]} + {NOISE_FLOOR[key]}")
+
+    if args.save_baseline:
+        # cases that were not run keep their old baseline
+        baseline.update(results)
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'cases': baseline}, f,
+                      indent=1, sort_keys=True)
+        print(f"Saved the baseline to {BASELINE_PATH}")
+    if unbaselined and not args.save_baseline:
+        print(f"NO BASELINE, not compared: {', '.join(unbaselined)}. Record one with --save-baseline, display_word "
+              f"cases under xvfb-run with --display.")
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    sys.exit(1 if regressions and not args.save_baseline else 0)
+
+
+if __name__ == '__main__':
+    main()
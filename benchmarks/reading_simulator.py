@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_SCRIPT = ("start,wait:30,pause,wait:3,play,wait:20,skip,wait:15,skip,wait:20,back,wait:10,restart,wait:30,"
+                  "skip,wait:40")
+NAVIGATIONS = ['start', 'skip', 'back', 'restart']
+# how long the simulated reader looks at a synthesis error before pressing Restart Index
+RETRY_SECONDS = 1.0
+SENTENCE_WORDS = ("the reader keeps a steady pace through every chapter while the next index is synthesized in the "
+                  "background").split()
+
+
+class SimulatedPlayback:
+    # The clock of a just_playback Playback without an audio device: the position advances with the monotonic
+    # clock while playing and stops at the end of the audio.
+    def __init__(self, duration_ms):
+        self.duration = duration_ms / 1000
+        self.offset = 0.0
+        self.started_at = None
+        self.active = False
+
+    @property
+    def curr_pos(self):
+        position = self.offset + (time.monotonic() - self.started_at if self.started_at is not None else 0)
+        return min(self.duration, position)
+
+    @property
+    def playing(self):
+        return self.started_at is not None and self.curr_pos < self.duration
+
+    def play(self):
+        self.active = True
+        self.started_at = time.monotonic()
+
+    def pause(self):
+        self.offset = self.curr_pos
+        self.started_at = None
+
+    def resume(self):
+        self.started_at = time.monotonic()
+
+    def seek(self, position):
+        self.offset = position
+        if self.started_at is not None:
+            self.started_at = time.monotonic()
+
+    def stop(self):
+        self.active = False
+        self.offset = 0.0
+        self.started_at = None
+
+
+def make_ssml_strings(paragraphs, num_tokens, seed):
+    import SsmlStrings
+
+    rng = random.Random(seed)
+    contents = [('h1', 'Chapter')]
+    for i in range(paragraphs):
+        contents.append(('p', ' '.join(rng.choice(SENTENCE_WORDS) for _ in range(rng.randint(10, 40))) + '.'))
+    return SsmlStrings.create_ssml_strings(contents, num_tokens)
+
+
+class SessionRecorder:
+    # Navigation, index start and index end times of one session, turned into gaps, time-to-first-word and stalls.
+    # A stall runs from the moment reading wants audio, after a navigation or when an index ends, until an index
+    # starts playing.
+    def __init__(self):
+        self.started = time.monotonic()
+        self.navigation = None
+        self.stalled_since = None
+        self.paused_since = None
+        self.paused_seconds = 0.0
+        self.gaps_ms = []
+        self.first_word_ms = {navigation: [] for navigation in NAVIGATIONS}
+        self.stall_seconds = 0.0
+        self.longest_stall_seconds = 0.0
+        self.indices = 0
+        self.failures = 0
+
+    def navigated(self, navigation):
+        now = time.monotonic()
+        self.navigation = (navigation, now)
+        if self.stalled_since is None:
+            self.stalled_since = now
+
+    def index_ended(self):
+        self.stalled_since = time.monotonic()
+        self.navigation = None
+
+    def index_started(self):
+        now = time.monotonic()
+        self.indices += 1
+        if self.navigation:
+            navigation, navigated_at = self.navigation
+            self.first_word_ms[navigation].append(round((now - navigated_at) * 1000, 1))
+        elif self.stalled_since is not None:
+            self.gaps_ms.append(round((now - self.stalled_since) * 1000, 1))
+        if self.stalled_since is not None:
+            self.stall_seconds += now - self.stalled_since
+            self.longest_stall_seconds = max(self.longest_stall_seconds, now - self.stalled_since)
+        self.navigation = None
+        self.stalled_since = None
+
+    def paused(self):
+        self.paused_since = time.monotonic()
+
+    def resumed(self):
+        if self.paused_since is not None:
+            self.paused_seconds += time.monotonic() - self.paused_since
+            self.paused_since = None
+
+    def report(self):
+        from DisplayProfiler import distribution
+
+        now = time.monotonic()
+        open_stall_seconds = now - self.stalled_since if self.stalled_since is not None else 0
+        stall_seconds = self.stall_seconds + open_stall_seconds
+        self.resumed()
+        wall_seconds = now - self.started
+        reading_seconds = max(0.0, wall_seconds - self.paused_seconds - stall_seconds)
+        return {
+            'wall_seconds': round(wall_seconds, 1),
+            'reading_seconds': round(reading_seconds, 1),
+            'paused_seconds': round(self.paused_seconds, 1),
+            'indices_started': self.indices,
+            'synthesis_failures': self.failures,
+            'gap_between_indices_ms': distribution(self.gaps_ms),
+            'time_to_first_word_ms': {navigation: distribution(values)
+                                      for navigation, values in self.first_word_ms.items() if values},
+            'stall_seconds': round(stall_seconds, 2),
+            'longest_stall_seconds': round(max(self.longest_stall_seconds, open_stall_seconds), 2),
+            'stall_seconds_per_reading_hour': round(stall_seconds / (reading_seconds / 3600), 1)
+            if reading_seconds else None,
+        }
+
+
+def create_reader_class(recorder):
+    from RapidReadProApp import RapidReadProApp
+
+    class SimulatedReader(RapidReadProApp):
+        # the reading screen with its playback replaced by SimulatedPlayback and every index start, end and
+        # synthesis failure reported to the recorder. A failed index is retried the way a reader would, with
+        # Restart Index, unless the script navigated away from it first.
+        def play_with_playback(self):
+            return SimulatedPlayback(self.milliseconds_audio_duration)
+
+        def started_index(self, index, streamed):
+            super().started_index(index, streamed)
+            recorder.index_started()
+
+        def finish_metrics(self, completed):
+            if completed:
+                recorder.index_ended()
+            super().finish_metrics(completed)
+
+        def show_failure(self, index, error):
+            super().show_failure(index, error)
+            recorder.failures += 1
+            self.master.after(int(RETRY_SECONDS * 1000), self.retry, index)
+
+        def retry(self, index):
+            if self.failed_index == index:
+                self.restart()
+
+    return SimulatedReader
+
+
+def run_script(app, recorder, steps, on_done):
+    if not steps:
+        on_done()
+        return
+    step, steps = steps[0], steps[1:]
+    if step.startswith('wait:'):
+        app.after(int(float(step[len('wait:'):]) * 1000), run_script, app, recorder, steps, on_done)
+        return
+    window = app.window
+    if step in NAVIGATIONS:
+        recorder.navigated(step)
+        if step == 'start':
+            # a repeated script starts over while the previous session may still be reading
+            window.stop_current()
+            window.start_audio_and_display(app.START_INDEX)
+        else:
+            getattr(window, step)()
+    elif step in ('pause', 'play'):
+        was_playing = window.playback is not None and window.playback.playing
+        window.play_pause()
+        if step == 'pause' and was_playing:
+            recorder.paused()
+        elif step == 'play' and not was_playing:
+            recorder.resumed()
+    else:
+        raise ValueError(f"Unknown step {step}")
+    app.after(0, run_script, app, recorder, steps, on_done)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the reading screen through scripted sessions against the "
+                                                 "local fake synthesizer and measure gaps, time-to-first-word and "
+                                                 "stalls")
+    parser.add_argument("--script", default=DEFAULT_SCRIPT,
+                        help="comma separated steps: start, pause, play, skip, back, restart, wait:<seconds>")
+    parser.add_argument("--sessions", type=int, default=1, help="times to run the script, one after another")
+    parser.add_argument("--fake", default="latency_ms=800,latency_jitter_ms=400,latency_distribution=lognormal,"
+                                          "failure_rate=0.02,word_ms=120,char_ms=10",
+                        help="fake synthesizer settings, as RAPID_READ_PRO_FAKE_TTS takes them")
+    parser.add_argument("--paragraphs", type=int, default=400)
+    parser.add_argument("--num-tokens", type=int, default=5)
+    parser.add_argument("--prefetch-depth", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-stall", type=float, default=30.0,
+                        help="fail when reading waits longer than this many seconds for an index")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    # a fresh cache, so every index is synthesized by the fake service
+    os.environ['RAPID_READ_PRO_HOME'] = tempfile.mkdtemp()
+    os.environ['RAPID_READ_PRO_TTS_BACKEND'] = 'fake'
+    os.environ['RAPID_READ_PRO_FAKE_TTS'] = f"{args.fake},seed={args.seed}"
+    os.environ['RAPID_READ_PRO_RESUME'] = '0'
+    import tkinter
+    import MainApp
+
+    try:
+        app = MainApp.MainApp()
+    except tkinter.TclError as error:
+        print(f"The simulator needs a display, e.g. run it under xvfb-run: {error}")
+        sys.exit(2)
+    recorder = SessionRecorder()
+    app.FILE = 'simulated.epub'
+    app.STREAMING = False
+    app.PREFETCH_DEPTH = args.prefetch_depth
+    app.ssml_strings = make_ssml_strings(args.paragraphs, args.num_tokens, args.seed)
+    app.window_classes[-1] = create_reader_class(recorder)
+    app.destroy_window()
+    app.current_window = len(app.window_classes) - 1
+    app.create_window()
+
+    steps = [step.strip() for step in args.script.split(',') if step.strip()] * args.sessions
+    report = {}
+
+    def done():
+        report.update(recorder.report())
+        app.on_closing()
+
+    app.after(0, run_script, app, recorder, steps, done)
+    app.mainloop()
+
+    report.update(script=args.script, sessions=args.sessions, fake=args.fake, prefetch_depth=args.prefetch_depth)
+    print(json.dumps(report, indent=1))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=1)
+    if report['longest_stall_seconds'] > args.max_stall:
+        print(f"STALLED: reading waited {report['longest_stall_seconds']} s for an index, more than --max-stall "
+              f"{args.max_stall} s")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
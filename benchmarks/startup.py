@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must load with the screen or function that needs them, never with MainApp
+DEFERRED_MODULES = ['azure.cognitiveservices.speech', 'pdfplumber', 'pdfminer', 'bs4', 'ebooklib', 'just_playback']
+
+# budgets a cold start must stay within on a developer machine
+MAX_IMPORT_MS = 150
+MAX_FIRST_WINDOW_MS = 1000
+MAX_FREEZE_MS = 100
+# the warm-up normally hands over its backend well within this
+WARM_UP_TIMEOUT_SECONDS = 30
+
+# run in a fresh interpreter, so every module is imported cold. With a key and region in the environment MainApp
+# warms up the speech backend, the main loop keeps running until that is handed over and the longest pass through
+# it is the longest the window froze.
+STARTUP_SCRIPT = """
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault('SPEECH_KEY', 'startup-benchmark')
+os.environ.setdefault('SPEECH_REGION', 'startup-benchmark')
+os.environ['RAPID_READ_PRO_RESUME'] = '0'
+started = time.perf_counter()
+import MainApp
+imported = time.perf_counter()
+result = {'import_ms': (imported - started) * 1000,
+          'loaded': [module for module in %r if module in sys.modules]}
+if %r:
+    import tkinter
+    try:
+        app = MainApp.MainApp()
+        app.update()
+        result['first_window_ms'] = (time.perf_counter() - started) * 1000
+        longest_pass = 0.0
+        while app.tts_backend_future is not None and time.perf_counter() - started < %r:
+            pass_started = time.perf_counter()
+            app.update()
+            longest_pass = max(longest_pass, time.perf_counter() - pass_started)
+            time.sleep(0.005)
+        result['warmed_up'] = app.tts_backend is not None
+        result['first_idle_ms'] = (time.perf_counter() - started) * 1000
+        result['longest_freeze_ms'] = longest_pass * 1000
+        app.on_closing()
+    except tkinter.TclError as error:
+        result['no_display'] = str(error)
+print(json.dumps(result))
+"""
+
+
+def run_startup(first_window, backend):
+    environment = dict(os.environ, RAPID_READ_PRO_TTS_BACKEND=backend)
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         STARTUP_SCRIPT % (DEFERRED_MODULES, first_window, WARM_UP_TIMEOUT_SECONDS)],
+        cwd=ROOT, env=environment, capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    # "import time: self [us] | cumulative | imported package", nested imports are indented
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return result, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold start of MainApp")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--backend", default="azure", choices=["azure", "fake"],
+                        help="speech backend warmed up after the first window")
+    parser.add_argument("--max-import-ms", type=float, default=MAX_IMPORT_MS,
+                        help="fail if importing MainApp takes longer")
+    parser.add_argument("--max-first-window-ms", type=float, default=MAX_FIRST_WINDOW_MS,
+                        help="fail if the first window takes longer to draw")
+    parser.add_argument("--max-freeze-ms", type=float, default=MAX_FREEZE_MS,
+                        help="fail if one pass through the main loop takes longer while the backend warms up")
+    args = parser.parse_args()
+
+    runs = [run_startup(True, args.backend) for _ in range(args.repeat)]
+    # the fastest run has the least noise from the rest of the machine
+    result, modules = min(runs, key=lambda run: run[0]['import_ms'])
+
+    print(f"{'module':50} {'self ms':>9} {'cumulative ms':>14}")
+    for name, self_ms, cumulative_ms in sorted(modules, key=lambda module: -module[2])[:args.top]:
+        print(f"{name:50} {self_ms:9.1f} {cumulative_ms:14.1f}")
+    print()
+    print(f"import MainApp: {result['import_ms']:.1f} ms (best of {args.repeat})")
+    first_window = [run[0]['first_window_ms'] for run in runs if 'first_window_ms' in run[0]]
+    first_idle = [run[0]['first_idle_ms'] for run in runs if 'first_idle_ms' in run[0]]
+    # a freeze is a stall of the Tk thread, the worst run shows it
+    freezes = [run[0]['longest_freeze_ms'] for run in runs if 'longest_freeze_ms' in run[0]]
+    if first_window:
+        print(f"time to first window: {min(first_window):.1f} ms (best of {len(first_window)})")
+        print(f"time to first idle with the {args.backend} backend warmed up: {min(first_idle):.1f} ms, "
+              f"longest freeze {max(freezes):.1f} ms")
+        if not all(run[0]['warmed_up'] for run in runs if 'warmed_up' in run[0]):
+            print(f"the {args.backend} backend did not warm up, see the log above")
+    else:
+        print(f"time to first window: skipped, {result.get('no_display', 'no display')}")
+
+    failures = []
+    if result['loaded']:
+        failures.append(f"imported with MainApp: {', '.join(result['loaded'])}")
+    if args.max_import_ms is not None and result['import_ms'] > args.max_import_ms:
+        failures.append(f"import MainApp took {result['import_ms']:.1f} ms, the budget is {args.max_import_ms} ms")
+    if args.max_first_window_ms is not None and first_window and min(first_window) > args.max_first_window_ms:
+        failures.append(f"the first window took {min(first_window):.1f} ms, the budget is "
+                        f"{args.max_first_window_ms} ms")
+    if args.max_freeze_ms is not None and freezes and max(freezes) > args.max_freeze_ms:
+        failures.append(f"the main loop froze for {max(freezes):.1f} ms while the backend warmed up, the budget is "
+                        f"{args.max_freeze_ms} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()